@@ -3,6 +3,7 @@ __version__ = '0.2.4'
 from .dow_handler import dow_handler
 from .plotting import plotconstr
 from .calculation import calc_stats
+from .calculation import batch_stats
 from .calculation import return_period
 from .calculation import geo
 from .helper import postgres
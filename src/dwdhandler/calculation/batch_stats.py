@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:12:00 2026
+
+@author: Tobias Schad
+@email: tobias.schad@googlemail.com
+@description: This module computes climatic normals and climate statistics of many
+              stations at once. The data of all stations of a chunk is stacked with
+              (STATIONS_ID, MESS_DATUM) as index, so each statistic is one groupby
+              over all stations instead of one station_data_handler per station
+"""
+
+#import system modules
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+#local modules
+from ..constants.filedata import *
+from ..constants.constpar import (STATIONNAMEID, DATENAMESTAT, STATION_VAR_DICT,
+                                  STATION_TEXT_VARS, CLIM_BATCH_CHUNK)
+from ..helper.hfunctions import (write_exc_info, write_sqlite_data, open_database, close_database,
+                                 check_for_table, create_table_res_climstats)
+from .calc_stats import calc_grouped_stats, RESAMPLE_TYPES
+
+# create class for batch of stations
+class station_batch_handler():
+    def __init__(self,dow,
+                 key_arr,
+                 columns=None,
+                 var_sum=False,
+                 var_max=False,
+                 clim_norms=None,
+                 percentiles=[0.1,0.9],
+                 chunksize=CLIM_BATCH_CHUNK,
+                 ldebug=False):
+        """
+        Init batch handler of climatic normals and climate statistics
+        dow        : dow_handler of parameter and resolution (data must already be stored in database)
+        key_arr    : list of station IDs
+        columns    : list of variables to calculate, default all variables of the table except
+                     station ID, date and text variables
+        var_sum    : Is it a variable which needs monthly sum (for example precipitation)
+        var_max    : Only calculate the maximum in resampled space
+        clim_norms : List of first years of normal periods, default [1961,1971,1981,1991]
+        percentiles: quantile values between 0 and 1 of climate statistics (default [0.1,0.9])
+        chunksize  : number of stations read and calculated at once (default CLIM_BATCH_CHUNK)
+        ldebug     : Some additional output
+        """
+
+        self.dow        = dow
+        self.key_arr    = [int(key) for key in key_arr]
+        self.var_sum    = var_sum
+        self.var_max    = var_max
+        self.percentiles = percentiles
+        self.chunksize  = chunksize
+        self.ldebug     = ldebug
+
+        self.tabname   = f'{dow.par}_{dow.resolution}'
+        self.tabname_c = f'{self.tabname}_clim'
+
+        if(clim_norms is None):
+            self.clim_norms = [1961,1971,1981,1991]
+        else:
+            self.clim_norms = clim_norms
+
+        self.table_vars = STATION_VAR_DICT[dow.resolution][dow.par]
+        if(columns is None):
+            self.columns = [var for var in self.table_vars
+                            if var not in [STATIONNAMEID, DATENAMESTAT] + STATION_TEXT_VARS]
+        else:
+            self.columns = list(columns)
+
+        self.results = {}
+
+    def run(self,workers=None,to_sqlite=True,bulk_load=False):
+        """Reads the data chunkwise, calculates all chunks and writes the results
+        Arguments:
+        -------------------
+            workers:   number of processes, default None means calculation in this process
+            to_sqlite: write results to database (default True)
+            bulk_load: open SQLite database with settings for bulk loads (default False)
+        returns
+            dictionary tablename --> DataFrame with results of all stations
+        """
+
+        chunks = [self.key_arr[i:i+self.chunksize] for i in range(0,len(self.key_arr),self.chunksize)]
+        results = []
+
+        if(workers is None or workers <= 1):
+            for keys in chunks:
+                results.append(calc_batch_chunk(self.get_chunk_data(keys),**self.calc_options()))
+        else:
+            # data is read here while the processes calculate the previous chunks
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(calc_batch_chunk,self.get_chunk_data(keys),**self.calc_options())
+                           for keys in chunks]
+                results = [future.result() for future in futures]
+
+        self.results = {}
+        for result in results:
+            for tabname, df_res in result.items():
+                self.results.setdefault(tabname, []).append(df_res)
+
+        for tabname in self.results:
+            self.results[tabname] = pd.concat(self.results[tabname],ignore_index=True)
+
+        if(to_sqlite):
+            self.write_results(bulk_load=bulk_load)
+
+        return self.results
+
+    def calc_options(self):
+        """Arguments of calc_batch_chunk which are the same for each chunk"""
+
+        return {'tabname_c':self.tabname_c,
+                'clim_norms':self.clim_norms,
+                'percentiles':self.percentiles,
+                'var_sum':self.var_sum,
+                'var_max':self.var_max}
+
+    def get_chunk_data(self,keys):
+        """Get data of several stations from database with one query (see dow_handler.get_dwd_stations_data)
+        Arguments:
+        -------------------
+            keys: list of station IDs
+        returns
+            DataFrame with (STATIONS_ID, MESS_DATUM) as index and self.columns as columns,
+            FillValue is masked
+        """
+
+        return self.dow.get_dwd_stations_data(keys,columns=self.columns,chunksize=len(keys))
+
+    def write_results(self,bulk_load=False):
+        """Writes each result table with one bulk insert and one commit
+        Arguments:
+        -------------------
+            bulk_load: open SQLite database with settings for bulk loads (default False)
+        """
+
+        dow = self.dow
+
+        filename = 'file:{}?cache=shared'.format(dow.pathdlocal+SQLITEFILESTAT)
+
+        con = open_database(filename, dow.ldbsave, dow.driver,
+                            dbschema=dow.dbschema,
+                            debug=dow.debug,
+                            config_dir=dow.config_dir,
+                            postfile=dow.dbconfigfile,
+                            bulk_load=bulk_load)
+
+        for tabname, df_res in self.results.items():
+            if(self.ldebug):
+                print(f"Write {tabname}: {len(df_res)} rows")
+
+            if('climstats' in tabname):
+                ctype = 'climstats'
+            else:
+                ctype = 'norm'
+
+            try:
+                if(not check_for_table(con,tabname,driver=dow.driver)):
+                    create_table_res_climstats(con,dow.resolution,dow.par,tabname,
+                                               ctype=ctype,driver=dow.driver)
+
+                write_sqlite_data(df_res, con, tabname, driver=dow.driver,
+                                  commit=False, debug=self.ldebug)
+                con.commit()
+            except:
+                write_exc_info()
+                con.rollback()
+
+        close_database(con, dow.driver)
+
+def calc_batch_chunk(df_chunk,tabname_c,clim_norms,percentiles=None,var_sum=False,var_max=False):
+    """Calculates climatic normals and climate statistics of all stations of a chunk
+       Is a module function, so it can be used by a process pool
+    Arguments:
+    -------------------
+        df_chunk:    DataFrame with (STATIONS_ID, MESS_DATUM) as index
+        tabname_c:   prefix of result tables (table name of data with suffix _clim)
+        clim_norms:  List of first years of normal periods
+        percentiles: quantile values between 0 and 1 of climate statistics
+        var_sum:     resample with sum
+        var_max:     resample with maximum
+    returns
+        dictionary tablename --> DataFrame, prepared like station_data_handler.prepare_to_sqlite
+    """
+
+    results = {}
+
+    if(df_chunk.empty):
+        return results
+
+    stations = df_chunk.index.get_level_values(STATIONNAMEID).unique().to_numpy()
+
+    df_daily   = resample_stack(df_chunk,RESAMPLE_TYPES['daily'],var_sum,var_max)
+    df_monthly = resample_stack(df_chunk,RESAMPLE_TYPES['monthly'],var_sum,var_max)
+    df_yearly  = resample_stack(df_chunk,RESAMPLE_TYPES['yearly'],var_sum,var_max)
+
+    for years in clim_norms:
+        yeare = years + 29
+
+        results[f'{tabname_c}_daily_{years}'] = calc_stack_daily_clim(
+            extract_stack_year(df_daily,years,yeare),stations)
+
+        df_clim = extract_stack_year(df_monthly,years,yeare)
+        df_clim = df_clim.groupby([df_clim.index.get_level_values(STATIONNAMEID),
+                                   df_clim.index.get_level_values(DATENAMESTAT).month.rename('Monat')]).mean()
+        results[f'{tabname_c}_monthly_{years}'] = df_clim.reset_index()
+
+        df_clim = extract_stack_year(df_yearly,years,yeare)
+        df_clim = df_clim.groupby(level=STATIONNAMEID).mean().reindex(stations)
+        df_clim.index.name = STATIONNAMEID
+        df_clim.insert(0,'Jahr',years)
+        results[f'{tabname_c}_yearly_{years}'] = df_clim.reset_index()
+
+    results[f'{tabname_c}_daily_climstats']   = calc_stack_daily_clim_stats(df_daily,stations,percentiles)
+    results[f'{tabname_c}_monthly_climstats'] = calc_stack_monthly_clim_stats(df_monthly,percentiles)
+
+    return results
+
+def resample_stack(df_in,type_resample,var_sum=False,var_max=False):
+    """Resample each station of stacked DataFrame
+    df_in:         DataFrame with (STATIONS_ID, MESS_DATUM) as index
+    type_resample: string --> Type of resampmling (D daily, M monthly, Y yearly, and so on)
+    """
+
+    grouped = df_in.groupby(level=STATIONNAMEID).resample(type_resample,level=DATENAMESTAT)
+
+    if(var_sum):
+        return grouped.sum()
+    elif(var_max):
+        return grouped.max()
+    else:
+        return grouped.mean()
+
+def extract_stack_year(df_in,years,yeare):
+    """Extract subdata of stacked DataFrame, only year is taken into account"""
+
+    year = df_in.index.get_level_values(DATENAMESTAT).year
+    return df_in[(year >= years) & (year <= yeare)]
+
+def nonleap_mmdd():
+    """Returns month*100+day of all days of a non leap year and their day of year"""
+
+    nonleap_range = pd.date_range('2001-01-01','2001-12-31')
+    return (nonleap_range.month * 100 + nonleap_range.day).to_numpy(), nonleap_range.dayofyear.to_numpy()
+
+def calc_stack_daily_clim(df_in,stations):
+    """Climatological mean on each day of the year of each station, Feb 29 is discarded
+    df_in:    DataFrame with (STATIONS_ID, MESS_DATUM) as index
+    stations: all stations which get 365 rows (also without data in normal period)
+    """
+
+    mmdd_year, doy = nonleap_mmdd()
+
+    dates = df_in.index.get_level_values(DATENAMESTAT)
+    mmdd  = dates.month * 100 + dates.day
+    lnoleap = mmdd != 229
+
+    df_clim = df_in[lnoleap].groupby([df_in.index.get_level_values(STATIONNAMEID)[lnoleap],
+                                      mmdd[lnoleap]]).mean()
+    df_clim = df_clim.reindex(pd.MultiIndex.from_product([stations, mmdd_year]))
+
+    df_clim.index = pd.MultiIndex.from_product([stations, doy],names=[STATIONNAMEID, 'Tag'])
+    return df_clim.reset_index()
+
+def calc_stack_daily_clim_stats(df_in,stations,percentiles=None):
+    """Maximum, minimum and percentiles on each day of the year of each station, Feb 29 is discarded
+    df_in:    DataFrame with (STATIONS_ID, MESS_DATUM) as index
+    stations: stations of df_in in order of index
+    """
+
+    mmdd_year, doy = nonleap_mmdd()
+
+    dates = df_in.index.get_level_values(DATENAMESTAT)
+    mmdd  = dates.month * 100 + dates.day
+
+    istation = np.searchsorted(stations, df_in.index.get_level_values(STATIONNAMEID))
+    codes    = istation * len(doy) + np.searchsorted(mmdd_year, mmdd)
+    codes[mmdd == 229] = -1 # skip Feb 29
+
+    df_out = calc_grouped_stats(df_in,codes,np.tile(doy,len(stations)),'DOY',percentiles)
+    df_out.insert(0,STATIONNAMEID,np.repeat(stations,len(df_out)//len(stations)))
+    return df_out
+
+def calc_stack_monthly_clim_stats(df_in,percentiles=None):
+    """Maximum, minimum and percentiles of each month of each station,
+       only months which occur in the data of a station are returned
+    df_in:    DataFrame with (STATIONS_ID, MESS_DATUM) as index
+    """
+
+    station = df_in.index.get_level_values(STATIONNAMEID).to_numpy()
+    month   = df_in.index.get_level_values(DATENAMESTAT).month.to_numpy()
+
+    pairs, codes = np.unique(station * 100 + month, return_inverse=True)
+
+    df_out = calc_grouped_stats(df_in,codes,pairs % 100,'Monat',percentiles)
+    df_out.insert(0,STATIONNAMEID,np.repeat(pairs // 100,len(df_out)//len(pairs)))
+    return df_out
@@ -18,10 +18,17 @@ import pandas as pd
 from ..constants.filedata import *
 from ..constants.constpar import (SQLITE_DRIVER)
 from ..helper.hfunctions import (write_sqlite, write_exc_info, write_sqlite_data,
-                                 drop_table, open_database, 
-                                 check_for_table, create_table_res_climstats,
+                                 drop_table, open_database, close_database,
+                                 get_table_names, create_table_res_climstats,
                                  check_drivers)
 
+# resampling rules, month and year end are 'ME' and 'YE' since pandas 2.2 ('M' and 'Y' before)
+try:
+    pd.tseries.frequencies.to_offset('ME')
+    RESAMPLE_TYPES = {'daily':'D', 'monthly':'ME', 'yearly':'YE'}
+except ValueError:
+    RESAMPLE_TYPES = {'daily':'D', 'monthly':'M', 'yearly':'Y'}
+
 # create class for station data
 class station_data_handler(dict):
     def __init__(self,df_tot,
@@ -35,6 +42,9 @@ class station_data_handler(dict):
                  base_dir=os.getcwd()+'/'+MAIN_FOLDER,
                  year_spec=None,
                  driver=SQLITE_DRIVER,
+                 dbconfigfile='.env',
+                 config_dir=None,
+                 dbschema='dwd',
                  ldebug=False):
         """
         Init station data handler.
@@ -47,6 +57,9 @@ class station_data_handler(dict):
         base_dir : Should be the same directory like sqlite data is stored to use one database
         year_spec: Is a special year wanted
         driver   : Specify driver to use
+        dbconfigfile: PostgreSQL only, name of config file (default .env)
+        config_dir: PostgreSQL only, directory of config file (default base_dir)
+        dbschema : PostgreSQL only, schema to use (default dwd)
         ldebug   : Some additional output
         """
 
@@ -73,8 +86,21 @@ class station_data_handler(dict):
             self.year_spec = df_tot.index.year[-1]  # should be a sorted index
         self.ldebug    = ldebug
 
+        self.driver  = driver
         self.ldbsave = check_drivers(driver)
 
+        self.dbconfigfile = dbconfigfile
+        self.dbschema     = dbschema
+        if(config_dir is None):
+            self.config_dir = base_dir
+        else:
+            self.config_dir = config_dir
+
+        # connection of write phase and tables known to exist in it
+        self.con              = None
+        self.known_tables     = None
+        self.known_tables_con = None
+
         self.FillValue = -999.
 
         self.df_tot    = df_tot.mask(df_tot == self.FillValue)
@@ -113,20 +139,20 @@ class station_data_handler(dict):
 
     def calc_daily_vals(self):
         """Calculates daily values --> resamples df_tot"""
-        self.df_daily = self.resample_df(self.df_tot,'D')
+        self.df_daily = self.resample_df(self.df_tot,RESAMPLE_TYPES['daily'])
 
     def calc_monthly_vals(self):
         """Calculates monthly values --> resamples df_tot"""
-        self.df_monthly = self.resample_df(self.df_tot,'M')
+        self.df_monthly = self.resample_df(self.df_tot,RESAMPLE_TYPES['monthly'])
 
     def calc_yearly_vals(self):
         """Calculates yearly values --> resamples df_tot"""
-        self.df_yearly = self.resample_df(self.df_tot,'Y')
+        self.df_yearly = self.resample_df(self.df_tot,RESAMPLE_TYPES['yearly'])
 
     def resample_df(self,df_in,type_resample):
         """Resample DataFrame
         df_in:         pandas DataFrame with datetime as index
-        type_resample: string --> Type of resampmling (D daily, M monthly, Y yearly, and so on)
+        type_resample: string --> Type of resampmling (see RESAMPLE_TYPES)
 
         Resampling also takes into account self.var_sum. If True the sum will be resampled otherwise mean
         """
@@ -212,99 +238,59 @@ class station_data_handler(dict):
 
     def calc_daily_clim_stats(self,df_in,percentiles=None):
         """This routine calculates climatolocal percentiles and maximum each day of the year
-           It discard Feb 29. So the return is 365 days. It does a loop over the days
-           because groupby takes leap years into account and therefore leads to 366 days
-           This approach may take more time than for example regroup
+           It discard Feb 29. So the return is 365 days. The days are numbered by
+           month and day of a non leap year, because groupby dayofyear takes leap years
+           into account and therefore leads to 366 days
         Arguments:
         -------------------
             df_in:  DataFrame with data (index must be date)
             percentiles: quantile values between 0 and 1. Default is None, so no quantiles calculated
         """
 
-        i = 1
-        for date in self.nonleap_range:
-            cond = (df_in.index.month == date.month) & (df_in.index.day == date.day)
-            df_minmax = df_in[cond].agg(['max','min'])
-            df_minmax['DOY'] = np.full(2,i)
-            try:
-                #df_out = df_out.append(df_minmax,ignore_index=True)
-                #df_out = df_out.append(df_minmax)
-                df_out = pd.concat([df_out,df_minmax])
-            except: # create the DataFrame
-                df_out = df_minmax.copy()
-
-            # as DataFrame should be created already just append percentiles
-            if(percentiles is not None):
-                df_percentiles = df_in[cond].quantile(percentiles,numeric_only=True)
-                df_percentiles['DOY'] = np.full(len(percentiles),i)
-                #df_out = df_out.append(df_percentiles,ignore_index=True)
-                #df_out = df_out.append(df_percentiles)
-                df_out = pd.concat([df_out,df_percentiles])
-            i += 1
-
-        df_out.reset_index(inplace=True)
-        df_out.rename(columns={'index':'stat'},inplace=True)
-        return df_out
+        nonleap_mmdd = self.nonleap_range.month * 100 + self.nonleap_range.day
+        mmdd = df_in.index.month * 100 + df_in.index.day
+
+        codes = np.searchsorted(nonleap_mmdd, mmdd)
+        codes[mmdd == 229] = -1 # skip Feb 29
+
+        return calc_grouped_stats(df_in,codes,self.nonleap_range.dayofyear,'DOY',percentiles)
 
     def calc_monthly_clim_stats(self,df_in,percentiles=None):
         """This routine calculates climatolocal percentiles and maximum each month in year 
-           It does a loop over the month
+           Only months which occur in the data are returned
         Arguments:
         -------------------
             df_in:  DataFrame with data (index must be date)
             percentiles: quantile values between 0 and 1. Default is None, so no quantiles calculated
         """
 
-        i = 1
-        self.df_test = df_in
-        for month in df_in.index.month.unique():
-            cond = (df_in.index.month == month)
-            df_minmax = df_in[cond].agg(['max','min'])
-            df_minmax['Monat'] = np.full(2,i)
-            try:
-                #df_out = df_out.append(df_minmax)
-                df_out = pd.concat([df_out,df_minmax])
-            except:
-                df_out = df_minmax.copy()
-            
-            # as DataFrame should be created already just append percentiles
-            if(percentiles is not None):
-                df_percentiles = df_in[cond].quantile(percentiles)
-                df_percentiles['Monat'] = np.full(len(percentiles),i)
-                #df_out = df_out.append(df_percentiles)
-                df_out = pd.concat([df_out,df_percentiles])
-            i += 1 
-
-        df_out.reset_index(inplace=True)
-        df_out.rename(columns={'index':'stat'},inplace=True)
-        return df_out
+        months = np.sort(df_in.index.month.unique())
+        codes  = np.searchsorted(months, df_in.index.month)
+
+        return calc_grouped_stats(df_in,codes,months,'Monat',percentiles)
 
     def calc_daily_clim(self,df_in):
         """This routine calculates the climatolocial mean on each day of the year
-           It discard Feb 29. So the return is 365 days. It does a loop over the days
-           because groupby takes leap years into account and therefore leads to 366 days
-           This approach may take more time than for example regroup
+           It discard Feb 29. So the return is 365 days. The data is grouped by
+           month and day (MMDD), because grouping by dayofyear takes leap years
+           into account and therefore leads to 366 days
         Arguments:
         -------------------
             df_in:  DataFrame with data (for example subdata with 30 years of data)
         """
 
-        lfirst = True
-        for date in self.nonleap_range:
-            cond = (df_in.index.month == date.month) & (df_in.index.day == date.day)
-            if(lfirst):
-                df_out = df_in[cond].mean().to_frame().T
-                lfirst = False
-                self.df_out = df_out
-            else:
-                df_tmp = df_in[cond].mean().to_frame().T
-                df_out = pd.concat([df_out,df_tmp],ignore_index=True)
+        mmdd = df_in.index.month * 100 + df_in.index.day
+        lnoleap = mmdd != 229
+
+        df_out = df_in[lnoleap].groupby(mmdd[lnoleap]).mean()
+
+        # days without any data are kept as NaN
+        df_out = df_out.reindex(self.nonleap_range.month * 100 + self.nonleap_range.day)
 
         df_out.index      = self.nonleap_range.dayofyear
         df_out.index.name = 'DOY'
         return df_out
 
-
     def add_df_statid(self,df_in):
         """Adds Station ID to DataFrame"""
         df_in.insert(0,'STATIONS_ID',np.full((len(df_in)),int(self.key)))
@@ -468,84 +454,170 @@ class station_data_handler(dict):
             write_exc_info()
 
     def write_all_clim_sqlite(self,key,clim_norms=None,force=False,
-                              driver=SQLITE_DRIVER):
+                              driver=None,con=None,commit=True):
         """Loop over DataFrames containing climatic normal periods
         Attention prepare_to_sqlite should be performed prior!
+        All tables are written with one connection in one transaction
         clim_norms: Specify special normal periods as desired --> starting year as list
+        driver: Driver to use, default None --> driver of this class
+        con: shared connection, for example to write many stations with one connection.
+             Default None --> connection is opened and closed here
+        commit: commit after all tables are written (default True)
         """
 
         if(not self.lsqlite_prep and not force):
             print("execute prepare_to_sqlite first or use force=True")
             return
-        
+
+        if(driver is None):
+            driver = self.driver
+
         if(clim_norms is None):
             clim_norms = self.default_clim_norms
 
-        for years in clim_norms:
-            #write daily vals
-            if(self.ldebug):
-                print("Write daily clim vals")
-            sdf_name = f'df_daily_c_{years}'
-            tabname  = f'{self.tabname_c}_daily_{years}'
-            self.write_clim_to_sqlite(self[sdf_name],key,tabname,'norm',driver)
+        lclose = con is None
+        if(lclose):
+            con = self.open_clim_database(driver)
+        if(con is None):
+            return
 
-            #write monthly vals
-            if(self.ldebug):
-                print("Write monthly clim vals")
-            sdf_name = f'df_monthly_c_{years}'
-            tabname  = f'{self.tabname_c}_monthly_{years}'
-            self.write_clim_to_sqlite(self[sdf_name],key,tabname,'norm',driver)
+        try:
+            for years in clim_norms:
+                #write daily vals
+                if(self.ldebug):
+                    print("Write daily clim vals")
+                sdf_name = f'df_daily_c_{years}'
+                tabname  = f'{self.tabname_c}_daily_{years}'
+                self.write_clim_to_sqlite(self[sdf_name],key,tabname,'norm',driver,con=con)
 
-            #write yearly vals
-            if(self.ldebug):
-                print("Write yearly clim vals")
-            sdf_name = f'df_yearly_c_{years}'
-            tabname  = f'{self.tabname_c}_yearly_{years}'
-            self.write_clim_to_sqlite(self[sdf_name],key,tabname,'norm',driver)
+                #write monthly vals
+                if(self.ldebug):
+                    print("Write monthly clim vals")
+                sdf_name = f'df_monthly_c_{years}'
+                tabname  = f'{self.tabname_c}_monthly_{years}'
+                self.write_clim_to_sqlite(self[sdf_name],key,tabname,'norm',driver,con=con)
 
-        try:
-            if(self.ldebug):
-                print("Write daily clim stats")
-            sdf_name = 'df_daily_clim_stats'
-            tabname  = f'{self.tabname_c}_daily_climstats'
-            self.write_clim_to_sqlite(self[sdf_name],key,tabname,'climstats',driver)
-        except:
-            write_exc_info()
-        try:
-            if(self.ldebug):
-                print("Write monthly clim stats")
-            sdf_name = 'df_monthly_clim_stats'
-            tabname  = f'{self.tabname_c}_monthly_climstats'
-            self.write_clim_to_sqlite(self[sdf_name],key,tabname,'climstats',driver)
+                #write yearly vals
+                if(self.ldebug):
+                    print("Write yearly clim vals")
+                sdf_name = f'df_yearly_c_{years}'
+                tabname  = f'{self.tabname_c}_yearly_{years}'
+                self.write_clim_to_sqlite(self[sdf_name],key,tabname,'norm',driver,con=con)
+
+            # clim stats are only written if they were calculated (calc_clim_stats)
+            for aggregation in ['daily','monthly']:
+                sdf_name = f'df_{aggregation}_clim_stats'
+                if(self.get(sdf_name) is None):
+                    continue
+                if(self.ldebug):
+                    print(f"Write {aggregation} clim stats")
+                tabname  = f'{self.tabname_c}_{aggregation}_climstats'
+                self.write_clim_to_sqlite(self[sdf_name],key,tabname,'climstats',driver,con=con)
+
+            if(commit):
+                con.commit()
         except:
+            if(not commit):
+                # transaction belongs to caller, which decides about rollback
+                raise
             write_exc_info()
-
+            self.rollback_clim_database(con)
+        finally:
+            if(lclose):
+                self.close_clim_database(driver)
 
     def write_clim_to_sqlite(self,df_in,key,
                              tablename,ctype=None,
-                             driver=SQLITE_DRIVER):
+                             driver=None,con=None):
         """Write sqlite data to 
         df_in: prepared DataFrame --> prepare_to_sqlite should be performed before
         key: Station ID
         tablename: Table name to write
+        driver: Driver to use, default None --> driver of this class
+        con: connection to use, nothing is committed then and errors are raised.
+             Default None --> connection is opened, committed and closed here
         """
 
-        # construct filename
-        filename = self.base_dir+STATION_FOLDER+SQLITEFILESTAT
+        if(driver is None):
+            driver = self.driver
 
-        con = open_database(filename,ldbsave=self.ldbsave)
+        lclose = con is None
+        if(lclose):
+            con = self.open_clim_database(driver)
+        if(con is None):
+            return
 
-        if(check_for_table(con,tablename,driver=driver)):
-            lcreate=False
-        else:
-            lcreate=True
+        try:
+            if(not self.check_clim_table(con,tablename,driver)):
+                create_table_res_climstats(con,self.resolution,self.par,tablename,ctype=ctype,
+                                           driver=driver,commit=False)
+                self.known_tables.add(tablename)
 
-        if(lcreate):
-            create_table_res_climstats(con,self.resolution,self.par,tablename,ctype=ctype)
+            write_sqlite_data(df_in, con, tablename,driver=driver,commit=False,debug=self.ldebug)
 
-        write_sqlite_data(df_in, con, tablename,driver=driver,debug=self.ldebug)
+            if(lclose):
+                con.commit()
+        except:
+            if(not lclose):
+                raise
+            write_exc_info()
+            self.rollback_clim_database(con)
+        finally:
+            if(lclose):
+                self.close_clim_database(driver)
+
+    def rollback_clim_database(self,con):
+        """Rolls back connection of write phase, tables created in the transaction are gone then
+        con: connection
+        """
+
+        con.rollback()
+        # table names are read again
+        self.known_tables_con = None
+
+    def open_clim_database(self,driver=None):
+        """Opens connection of write phase, an already open connection is reused
+        driver: Driver to use, default None --> driver of this class
+        """
+
+        if(driver is None):
+            driver = self.driver
+
+        if(self.con is None):
+            # construct filename
+            filename = self.base_dir+STATION_FOLDER+SQLITEFILESTAT
+
+            self.con = open_database(filename,self.ldbsave,driver,
+                                     dbschema=self.dbschema,
+                                     config_dir=self.config_dir,
+                                     postfile=self.dbconfigfile,
+                                     debug=self.ldebug)
 
-        con.close()
+        return self.con
+
+    def close_clim_database(self,driver=None):
+        """Closes connection of write phase"""
+
+        if(driver is None):
+            driver = self.driver
+
+        if(self.con is not None):
+            close_database(self.con,driver)
+
+        self.con = None
+
+    def check_clim_table(self,con,tablename,driver):
+        """Checks if table exists. All table names are read once per connection
+        con: connection
+        tablename: Table name to check
+        driver: Driver to use
+        """
+
+        if(con is not self.known_tables_con):
+            self.known_tables     = get_table_names(con,driver)
+            self.known_tables_con = con
+
+        return tablename in self.known_tables
     
     def combine_df_clim_class(self,station_data_class,clim_norms=None):
         """This combines climate normal Dataframes from another instance
@@ -596,3 +668,70 @@ class station_data_handler(dict):
             self[sdf_name].columns = self[sdf_name].columns.str.rstrip("_x")
         except:
             pass
+
+def calc_grouped_stats(df_in,codes,groups,group_name,percentiles=None):
+    """Calculates maximum, minimum and percentiles of each group in one pass
+       Each column is sorted once by group and value (NaN last). Afterwards all
+       statistics of all groups are taken by index from the sorted values.
+       Percentiles are linearly interpolated like pandas quantile
+    Arguments:
+    -------------------
+        df_in:  DataFrame with numeric data
+        codes:  array with group number (0 ... len(groups)-1) of each row, rows with -1 are skipped
+        groups: value of each group, written to column group_name
+        group_name: name of group column (e.g. DOY or Monat)
+        percentiles: quantile values between 0 and 1. Default is None, so no quantiles calculated
+    returns
+        DataFrame in long format: stat (max, min, percentiles), data columns, group_name
+    """
+
+    if(percentiles is None):
+        percentiles = []
+
+    stat_names = ['max','min'] + list(percentiles)
+    ngroups = len(groups)
+    nstats  = len(stat_names)
+
+    codes  = np.asarray(codes)
+    lrow   = codes >= 0
+    codes  = codes[lrow]
+    values = df_in.to_numpy(dtype=np.float64, na_value=np.nan)[lrow]
+
+    stats = np.full((ngroups, nstats, values.shape[1]), np.nan)
+
+    # first position of each group in sorted data
+    counts = np.bincount(codes, minlength=ngroups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    for icol in range(values.shape[1]):
+        col = values[:,icol]
+        col_sorted = col[np.lexsort((col, codes))]
+
+        nvalid = np.bincount(codes, weights=~np.isnan(col), minlength=ngroups).astype(np.int64)
+        lvalid = nvalid > 0
+        first  = starts[lvalid]
+        nvalid = nvalid[lvalid]
+
+        stats[lvalid,0,icol] = col_sorted[first + nvalid - 1]
+        stats[lvalid,1,icol] = col_sorted[first]
+
+        for iperc, perc in enumerate(percentiles):
+            pos  = perc * (nvalid - 1)
+            ilow = np.floor(pos).astype(np.int64)
+            frac = pos - ilow
+            vlow  = col_sorted[first + ilow]
+            vhigh = col_sorted[first + np.ceil(pos).astype(np.int64)]
+            stats[lvalid,2+iperc,icol] = vlow + (vhigh - vlow) * frac
+
+    df_out = pd.DataFrame(stats.reshape(ngroups*nstats, values.shape[1]), columns=df_in.columns)
+
+    # keep integer columns as integer if possible (only max and min)
+    if(len(percentiles) == 0):
+        for col in df_in.columns:
+            if(df_in[col].dtype.kind in 'iu' and not df_out[col].isna().any()):
+                df_out[col] = df_out[col].astype(df_in[col].dtype)
+
+    df_out.insert(0,'stat',np.tile(np.array(stat_names,dtype=object), ngroups))
+    df_out[group_name] = np.repeat(np.asarray(groups,dtype=np.int64), nstats)
+
+    return df_out
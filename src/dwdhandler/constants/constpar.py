@@ -13,8 +13,26 @@ DATENAMESTAT = 'MESS_DATUM' # Name of time variable of station data
 DATENAMESTATEND = 'MESS_DATUM_ENDE'
 STATIONNAMEQUAL = 'QN'
 
+# format of time variable of station data for each resolution
+STATION_DATE_FORMAT = {'10_minutes':'%Y%m%d%H%M',
+                       'hourly':'%Y%m%d%H',
+                       'daily':'%Y%m%d',
+                       'monthly':'%Y%m',
+                       'yearly':'%Y'}
+
+# time step of station data for each resolution, used for the exclusive end of a date range
+STATION_DATE_FREQ = {'10_minutes':'10min',
+                     'hourly':'1h',
+                     'daily':'D',
+                     'monthly':'M',
+                     'yearly':'Y'}
+
 RADIUSEARTH = 6371000
 
+# NetCDF file of raster data
+RASTERCUBETIMEUNITS = 'days since 1881-01-01 00:00:00'
+RASTERCUBECOMPLEVEL = 4 # zlib compression level
+
 RASTERFACTDICT = {
     'air_temperature_max':0.1,
     'air_temperature_mean':0.1,
@@ -59,8 +77,40 @@ STATION_DATE_END_VARS = []
 
 REGAVG_PRIMARY_KEYS = ['Jahr','season','Monat']
 
+# integer columns of all tables, used to write data with COPY
+POSTGRES_INT_VARS = STATION_INT_VARS + ['Jahr','Monat','Tag','DOY']
+
 
 # Regarding drivers
 SQLITE_DRIVER = 'SQLite'
 POSTGRES_DRIVER = 'PostgreSQL'
-ALLOWED_DRIVERS = [SQLITE_DRIVER, POSTGRES_DRIVER]
\ No newline at end of file
+PARQUET_DRIVER = 'Parquet' # needs pyarrow
+ALLOWED_DRIVERS = [SQLITE_DRIVER, POSTGRES_DRIVER, PARQUET_DRIVER]
+
+# columns which identify a row of Parquet tables (like the primary keys of database tables)
+PARQUET_KEY_VARS = STATION_PRIMARY_KEYS + REGAVG_PRIMARY_KEYS + ['stat','DOY','Tag','pathremote','filename']
+
+# PostgreSQL connection pool of sqlalchemy engine
+POSTGRES_POOL_SIZE    = 5
+POSTGRES_MAX_OVERFLOW = 10
+POSTGRES_PRE_PING     = True # test connection before it is used
+POSTGRES_RECYCLE      = 1800 # seconds after which connections are replaced
+
+# SQLite settings
+SQLITE_PRAGMAS = ['PRAGMA synchronous = EXTRA',
+                  'PRAGMA journal_mode = WAL']
+# only used for bulk loads: no fsync, 256 MB page cache, temporary data in memory
+SQLITE_BULK_PRAGMAS = ['PRAGMA synchronous = OFF',
+                       'PRAGMA journal_mode = WAL',
+                       'PRAGMA cache_size = -262144',
+                       'PRAGMA temp_store = MEMORY']
+SQLITE_ROW_CHUNK = 100000 # number of rows converted at once for executemany
+
+# number of stations read with one query (WHERE STATIONS_ID IN (...))
+STATION_IN_CHUNK = 200
+
+# Climate statistics of many stations
+CLIM_BATCH_CHUNK = 50 # number of stations read and calculated at once
+
+# encodings tried for text files of DWD (e.g. station lists), latin-1 never fails
+TEXT_ENCODINGS = ['utf-8-sig', 'cp1252', 'latin-1']
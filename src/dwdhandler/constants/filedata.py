@@ -13,8 +13,14 @@ STATION_FOLDER  = 'station_data/'
 RASTER_FOLDER   = 'raster_data/'
 REGAVG_FOLDER   = 'regavg/'
 NWP_FOLDER      = 'nwp_data/'
+GRIDCACHE_FOLDER = 'grid_cache/' # lon lat grids of raster data, sub folder of RASTER_FOLDER
+LISTING_FOLDER  = 'listing/' # cached listings of remote directories, sub folder of METADATA_FOLDER
 SQLITEFILESTAT  = 'DWD_STATION.sqlite'
+RASTERCUBEFILE  = 'grids_germany_{resolution}_{par}.nc' # NetCDF file of raster data in folder of parameter
 SQLITEREGAVG    = 'DWD_regavg.sqlite'
+SYNCMANIFESTTAB = 'sync_manifest' # table which keeps state of synchronised archives
+PARQUET_FOLDER  = 'parquet/' # datasets of Parquet driver, sub folder of folder of SQLite file
+STATIONLISTCACHE = '.pkl' # suffix of parsed station list next to metadata file
 
 # Available dtypes
 DTYPEAVAIL = ['station','raster','regavg','nwp']
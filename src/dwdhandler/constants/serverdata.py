@@ -13,3 +13,22 @@ SERVERPATH_RASTER_GERM = 'climate_environment/CDC/grids_germany/'
 SERVERPATH_REG_GERM = 'climate_environment/CDC/regional_averages_DE/'
 SERVERPATH_NWP = 'weather/nwp/'
 SERVERPATH_RADAR = 'weather/radar/'
+
+
+# ftp connection handling
+FTPTIMEOUT    = 60  # seconds until a blocking ftp operation is aborted
+FTPPOOLSIZE   = 8   # maximum number of connections per server and user
+FTPMAXIDLE    = 300 # seconds a connection may be unused before it is closed
+FTPKEEPALIVE  = 30  # seconds after which an idle connection is checked with NOOP
+LISTINGTTL    = 3600 # seconds a cached listing of a remote directory is used
+FTPRETRIES    = 3   # retries of a failed download
+FTPBACKOFF    = 2.  # seconds before first retry, doubled for each further retry
+FTPBLOCKSIZE  = 1024*1024 # bytes per block of a download
+
+# transports to reach SERVERNAME
+FTP_TRANSPORT   = 'ftp'
+HTTPS_TRANSPORT = 'https'
+ALLOWED_TRANSPORTS = [FTP_TRANSPORT, HTTPS_TRANSPORT]
+HTTPSBASEURL    = {SERVERNAME:f'https://{SERVERNAME}/'} # base url of server, default https://<server>/
+HTTPSRANGEPARTS = 4  # number of parallel range requests of big files
+HTTPSRANGEMIN   = 32*1024*1024 # bytes from which files are downloaded with parallel range requests
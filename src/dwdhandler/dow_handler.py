@@ -14,6 +14,13 @@ import os
 import pandas as pd
 import datetime
 import shutil
+import hashlib
+import threading
+import queue
+import time
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
 from sqlalchemy import text
@@ -31,15 +38,22 @@ except:
     ltransform = False
 
 # local modules
-from .constants.serverdata import SERVERPATH_CLIMATE_GERM, SERVERNAME, SERVERPATH_NWP, SERVERPATH_RASTER_GERM, SERVERPATH_REG_GERM
+from .constants.serverdata import SERVERPATH_CLIMATE_GERM, SERVERNAME, SERVERPATH_NWP, SERVERPATH_RASTER_GERM, SERVERPATH_REG_GERM, FTPPOOLSIZE
 from .constants.filedata import *
-from .constants.constpar import ASCIIRASCRS, FILLVALUE, RASTERFACTDICT, SQLITE_DRIVER, POSTGRES_DRIVER
+from .constants.constpar import (ASCIIRASCRS, FILLVALUE, RASTERFACTDICT, SQLITE_DRIVER, POSTGRES_DRIVER, PARQUET_DRIVER,
+                                  STATIONNAMEID, DATENAMESTAT, STATION_DATE_FORMAT, STATION_DATE_FREQ,
+                                  STATION_VAR_DICT, STATION_IN_CHUNK)
 from .helper.hfunctions import (check_create_dir, delete_sqlite_where, 
-                                list_files, read_station_list, unzip_file, update_progress, 
+                                list_files, read_station_list, load_station_list, save_station_list, unzip_file, update_progress, 
                                 write_sqlite, delete_sqlite_where, open_database, close_database,
                                 check_for_table, create_table_res, create_table_regavg,
-                                write_sqlite_data, check_drivers)
-from .helper.ftp import cftp
+                                write_sqlite_data, check_drivers, read_zip_csv, parse_ascii_grid,
+                                create_table_manifest, read_manifest, write_manifest, write_manifests,
+                                create_station_index, get_quality_vars, int_to_datetime, run_in_thread)
+from .helper.transport import get_transport_pool, check_transport
+from .helper.rastercube import raster_cube, lnetcdf
+from .helper.rasterseries import raster_series
+from .helper.listing import listing_cache
 
 class dow_handler(dict):
     def __init__(self,
@@ -55,6 +69,7 @@ class dow_handler(dict):
                  dbconfigfile='.env',
                  config_dir=None,
                  dbschema='dwd',
+                 transport='ftp',
                  debug = False
                 ):
         """
@@ -67,6 +82,7 @@ class dow_handler(dict):
         nwpgrid: Grid of numerical forecast, default 'regular-lat-lon'
         local_time: translate to local time if wanted, otherwise time is in UTC
         date_check: check list of station data has to be data to this given date, if not specified today is used
+        transport: 'ftp' or 'https' (needs requests); how all retrieve methods reach the server, default 'ftp'
         debug: True or False. Some more output
         
         dtype raster has to be set with period recent (which is default value)! 
@@ -89,6 +105,7 @@ class dow_handler(dict):
         self.driver = driver
         self.dbconfigfile = dbconfigfile
         self.dbschema = dbschema
+        self.transport = transport
         self.debug  = debug
         self.local_time = local_time
         self.date_check = date_check
@@ -104,14 +121,26 @@ class dow_handler(dict):
         self.tmp_dir    = 'tmp{}/'.format(datetime.datetime.now().strftime('%s'))
         # create table name for sqlite database
         self.tabname = f"{self.par}_{self.resolution}"
+        # cached climatology of raster data (see raster_series)
+        self.raster_clim = {}
+        # cached listings of remote directories
+        self.listing = listing_cache(self.base_dir+METADATA_FOLDER+LISTING_FOLDER)
 
         self.ldbsave = check_drivers(driver)
 
+        if(not check_transport(transport)):
+            return
+
         icheck = self.prepare_download()
 
         if(icheck != 0):
             return
 
+    @property
+    def pool(self):
+        """ Connection pool of transport """
+        return get_transport_pool(self.transport)
+
     def prepare_download(self):
         """ Prepare download data 
         """
@@ -221,34 +250,56 @@ class dow_handler(dict):
     
     def get_station_metadata(self):
         """ Get Station Metadata
+            The parsed station list is cached next to the metadata file with the modification
+            time of the remote file, it is only downloaded and parsed again if the remote file changed.
         """
 
         # create meta data filename 
         filename = self.create_station_metaname()
+        fil_cache = self.pathmlocal+filename+STATIONLISTCACHE
 
         # check if dir already exists
         check_create_dir(self.pathmlocal)
+
+        # modification time of remote file from (cached) listing
+        mtime = None
+        try:
+            facts = self.get_remote_files().get(filename)
+            if(facts is not None and facts[1]):
+                mtime = facts[1]
+        except Exception as Excp:
+            print("Something went wrong during listing Metadata")
+            print(Excp)
+
+        if(mtime is not None):
+            df_station_list = load_station_list(fil_cache,mtime)
+            if(df_station_list is not None):
+                if(self.debug):
+                    print(f"Station list of {filename} read from cache")
+                self.df_station_list = df_station_list
+                return
+
         # Try to download Metadatafile
+        metaftp = None
         try:
-            metaftp = cftp(SERVERNAME)
-            metaftp.open_ftp()
+            metaftp = self.pool.acquire(SERVERNAME)
             metaftp.cwd_ftp(self.pathremote)
-            os.chdir(self.pathmlocal)
 
             if(self.debug):
                 print(f"Retrieve {self.pathremote+filename}")
 
-            metaftp.save_file(filename,filename)
-        
-            metaftp.close_ftp()
+            metaftp.save_file(filename,self.pathmlocal+filename)
         except Exception as Excp:
             print("Something went wrong during downloading Metadata")
             print(Excp)
 
-        os.chdir(self.home_dir)
+        if(metaftp is not None):
+            self.pool.release(metaftp)
 
         try:
             self.df_station_list = read_station_list(self.pathmlocal,filename)
+            if(mtime is not None):
+                save_station_list(fil_cache,mtime,self.df_station_list)
         except Exception as Excp:
             print("Something went wrong during reading Metadata")
             print(Excp)
@@ -285,9 +336,70 @@ class dow_handler(dict):
 
         return f'regional_averages_{REG_CONV_MAP[self.par]}_{time}.txt'
 
+    def get_remote_files(self,refresh=False):
+        """ Returns listing of self.pathremote as dictionary file name --> (size, modification time)
+            The listing is cached (see listing_cache) and only retrieved again after LISTINGTTL seconds
+            refresh: retrieve listing in any case, default False
+        """
+
+        def retrieve():
+            metaftp = self.pool.acquire(SERVERNAME)
+            try:
+                metaftp.cwd_ftp(self.pathremote)
+                return metaftp.retr_files_facts_ftp()
+            finally:
+                self.pool.release(metaftp)
+
+        return self.listing.get(self.pathremote,retrieve,refresh=refresh,transport=self.transport)
+
+    def create_station_file_index(self,remote_files):
+        """ Returns dictionary station ID (5 digits) --> list of archives of station in remote_files
+            Historical 10 minutes data has several archives per station
+        """
+
+        index = {}
+        for name in sorted(remote_files):
+            if(not name.endswith('.zip')):
+                continue
+            for token in name.split('_'):
+                if(len(token) == 5 and token.isdigit()):
+                    index.setdefault(token,[]).append(name)
+                    break
+
+        return index
+
+    def plan_dwd_station(self,key_arr,refresh=False):
+        """ Resolves station IDs to the archives in the listing of the remote directory
+            key_arr: IDs of stations
+            refresh: retrieve listing in any case, default False
+            returns dictionary with list of archives (files), IDs without archive (missing)
+                    and number of bytes of all archives (bytes) or None if there is no listing
+        """
+
+        try:
+            remote_files = self.get_remote_files(refresh=refresh)
+        except Exception as Excp:
+            print(f"Listing of {self.pathremote} failed: {Excp}")
+            return None
+
+        index = self.create_station_file_index(remote_files)
+
+        files   = []
+        missing = []
+        for key in key_arr:
+            names = index.get(f'{int(key):05d}')
+            if(names is None):
+                missing.append(key)
+            else:
+                files += [name for name in names if name not in files]
+
+        return {'files':files,
+                'missing':missing,
+                'bytes':sum(remote_files[name][0] for name in files)}
+
     def create_station_filename(self,key):
         """ Creates file location on ftp 
-        TODO: adapt 
+            The name of historical archives is guessed, plan_dwd_station gets the exact names from the listing
         """
 
         if(self.period == 'recent'):
@@ -386,39 +498,153 @@ class dow_handler(dict):
 
         print("NWP Metadata not yet implemented")
 
-    def retrieve_dwd_nwp(self,max_hour=48,**kwargs):
+    def retrieve_dwd_nwp(self,max_hour=48,mlayer=NWPMAXMOLEV,player=1000,workers=1,decompress=False):
         """ Retrieves DWD NWP data
-            max_hour: defines the maximum hour to get; default 48 hours
+            max_hour:   defines the maximum hour to get; default 48 hours
+            mlayer:     model level or list of model levels (only model-level parameters), default NWPMAXMOLEV
+            player:     pressure level or list of pressure levels (only pressure-level parameters), default 1000
+            workers:    number of parallel ftp sessions (default 1), limited by the size of the ftp connection pool
+            decompress: True/False; decompress bz2 files while they are downloaded, default False
+            Only files which are in the listing of the remote directory are requested
         """
 
+        file_arr = self.create_nwp_file_list(max_hour,mlayer,player)
+
         # Are the pathes there
         check_create_dir(self.pathdlocal)
-        os.chdir(self.pathdlocal)
 
-        metaftp = cftp(SERVERNAME)
-        metaftp.open_ftp()
-        metaftp.cwd_ftp(self.pathremote)
+        try:
+            remote_files = self.get_remote_files()
+        except Exception as Excp:
+            print(f"Listing of {self.pathremote} failed, all files are requested: {Excp}")
+            remote_files = set(file_arr)
+
+        not_in_list = [self.pathremote+filename for filename in file_arr if filename not in remote_files]
+        file_arr    = [filename for filename in file_arr if filename in remote_files]
+
+        if(self.debug):
+            print(f"{len(file_arr)} files to retrieve, {len(not_in_list)} not on server")
+
+        workers = min(workers,len(file_arr),self.pool.max_size)
+
+        file_queue = queue.Queue()
+        for filename in file_arr:
+            file_queue.put(filename)
+        for iworker in range(workers):
+            file_queue.put(None) # stop signal for each worker
+
+        result_queue = queue.Queue()
+
+        threads = []
+        for iworker in range(workers):
+            thread = threading.Thread(target=self.nwp_download_worker,
+                                      args=(iworker,file_queue,result_queue,decompress),
+                                      daemon=True)
+            thread.start()
+            threads.append(thread)
 
         ii = 0
-        i_tot = max_hour
-        not_in_list = []
-        for i in range(max_hour):
-                update_progress(i/i_tot)
-                filename = self.create_nwp_filename(i,**kwargs)
+        i_tot = float(max(len(file_arr),1))
+        excp_workers = []
+        active = workers
+        while(active > 0):
+            result = result_queue.get()
+            if(result is None): # worker finished
+                active -= 1
+                continue
+            if(isinstance(result, BaseException)): # worker failed, the others go on with its files
+                excp_workers.append(result)
+                active -= 1
+                continue
+
+            filename, excp = result
+            update_progress(ii/i_tot)
+            ii = ii + 1
 
-                if(self.debug):
-                    print(f"Retrieve: {self.pathremote+filename}")
+            if(excp is not None):
+                print(excp)
+                print(f"{self.pathremote+filename} not found")
+                not_in_list.append(self.pathremote+filename)
 
-                try:
-                        metaftp.save_file(filename,filename)
-                except:
-                    print(f"{self.pathremote+filename} not found")
-                    not_in_list.append(self.pathremote+filename)
+        for thread in threads:
+            thread.join()
 
+        if(len(excp_workers) > 0):
+            raise excp_workers[0]
 
-        metaftp.close_ftp()
+        # files which were left in queue, because no worker was able to connect
+        while(not file_queue.empty()):
+            filename = file_queue.get()
+            if(filename is not None):
+                not_in_list.append(self.pathremote+filename)
 
-        os.chdir(self.home_dir)
+        # attach all files which are not found
+        self.stations_not_found = not_in_list
+
+    def create_nwp_file_list(self,max_hour,mlayer=NWPMAXMOLEV,player=1000):
+        """ Creates file names of all forecast steps and levels
+            mlayer, player: single level or list of levels
+        """
+
+        if(not isinstance(mlayer, list)):
+            mlayer = [mlayer]
+        if(not isinstance(player, list)):
+            player = [player]
+
+        if(NWPNAMEDICT[self.par] == 'model-level'):
+            levels = [{'mlayer':level} for level in mlayer]
+        elif(NWPNAMEDICT[self.par] == 'pressure-level'):
+            levels = [{'player':level} for level in player]
+        else:
+            levels = [{}]
+
+        return [self.create_nwp_filename(hour,**level) for hour in range(max_hour) for level in levels]
+
+    def nwp_download_worker(self,iworker,file_queue,result_queue,decompress=False):
+        """ Worker of retrieve_dwd_nwp
+            Downloads files to pathdlocal until it gets a stop signal (None) from file_queue
+            decompress: bz2 files are decompressed while they are downloaded (file name without .bz2)
+            When it stops it puts None into result_queue, or the exception if it failed unexpectedly
+        """
+
+        metaftp = None
+        broken  = False
+        excp_worker = None
+        try:
+            try:
+                metaftp = self.pool.acquire(SERVERNAME)
+                metaftp.cwd_ftp(self.pathremote)
+            except Exception as Excp:
+                print(f"Worker {iworker} could not connect: {Excp}")
+                broken = True
+                return
+
+            while(True):
+                filename = file_queue.get()
+                if(filename is None):
+                    break
+
+                if(self.debug):
+                    print(f"Worker {iworker} retrieve: {self.pathremote+filename}")
+
+                try:
+                    if(decompress and filename.endswith('.bz2')):
+                        metaftp.save_file(filename,self.pathdlocal+filename[:-4],decompress='bz2')
+                    else:
+                        metaftp.save_file(filename,self.pathdlocal+filename)
+                    result = (filename, None)
+                except Exception as Excp:
+                    result = (filename, Excp)
+
+                result_queue.put(result)
+        except BaseException as Excp:
+            broken = True
+            excp_worker = Excp
+        finally:
+            if(metaftp is not None):
+                self.pool.release(metaftp,broken=broken)
+            # retrieve_dwd_nwp waits for one stop signal of each worker
+            result_queue.put(excp_worker)
 
     def retrieve_dwd_regavg(self):
         """Retrieves DWD regional average data
@@ -460,33 +686,36 @@ class dow_handler(dict):
             print(f"Create Table {self.tabname}")
             lcreate=True
 
-        # Log in to ftp server
-        metaftp = cftp(SERVERNAME)
-        metaftp.open_ftp()
-        # change to remote directory
-        metaftp.cwd_ftp(self.pathremote)
+        # Borrow logged in ftp connection
+        metaftp = self.pool.acquire(SERVERNAME)
+        broken  = True
+        try:
+            # change to remote directory
+            metaftp.cwd_ftp(self.pathremote)
 
-        # download files listed in filenlist
-        for filename in filenlist:
-            if(self.debug):
-                print(f'Retrieve: {self.pathremote+filename}')
-            metaftp.save_file(filename,filename)
-            df_tmp = pd.read_csv(filename,delimiter=';',skiprows=[0])
-            df_tmp.rename(columns={'winter':'season','spring':'season','summer':'season','autumn':'season'},inplace=True)
-            df_tmp.drop(columns=df_tmp.columns[df_tmp.columns.str.contains('Unnamed')],inplace=True)
-            df_tmp.drop(columns=df_tmp.columns[df_tmp.columns.str.contains('Jahr.1')],inplace=True)
-            df_tmp.columns = df_tmp.columns.str.replace('-','_')
-            df_tmp.columns = df_tmp.columns.str.replace('/','_')
-            if(lcreate):
-                create_table_regavg(con,resolution=self.resolution,par=self.par,keys=df_tmp.keys())
-            write_sqlite_data(df_tmp, con, self.tabname, self.driver)
-
-        # close ftp connection
-        metaftp.close_ftp()
+            # download files listed in filenlist
+            for filename in filenlist:
+                if(self.debug):
+                    print(f'Retrieve: {self.pathremote+filename}')
+                metaftp.save_file(filename,filename)
+                df_tmp = pd.read_csv(filename,delimiter=';',skiprows=[0])
+                df_tmp.rename(columns={'winter':'season','spring':'season','summer':'season','autumn':'season'},inplace=True)
+                df_tmp.drop(columns=df_tmp.columns[df_tmp.columns.str.contains('Unnamed')],inplace=True)
+                df_tmp.drop(columns=df_tmp.columns[df_tmp.columns.str.contains('Jahr.1')],inplace=True)
+                df_tmp.columns = df_tmp.columns.str.replace('-','_')
+                df_tmp.columns = df_tmp.columns.str.replace('/','_')
+                if(lcreate):
+                    create_table_regavg(con,resolution=self.resolution,par=self.par,keys=df_tmp.keys())
+                write_sqlite_data(df_tmp, con, self.tabname, self.driver)
 
-        close_database(con, self.driver)
+            broken = False
+        finally:
+            # give ftp connection back to pool, a connection which failed is not reused
+            self.pool.release(metaftp,broken=broken)
+
+            close_database(con, self.driver)
 
-        os.chdir(self.home_dir)
+            os.chdir(self.home_dir)
 
         try:
             shutil.rmtree(self.pathdlocaltmp)
@@ -503,7 +732,69 @@ class dow_handler(dict):
                    normal period. Valid as beginning year 1961, 1971, 1981, 1991
             month: can be a single month or a list with starting month and end month
                    [1,4] means download data from January to February
-            to_netcdf: True/False; True save data to a netCDF File -- Not Yet implemented!! --
+            to_netcdf: True/False; True saves monthly grids to one NetCDF file (see create_raster_cube_filename)
+                       instead of ASCII files. Months already in the file are replaced, new ones appended.
+        """
+
+        if(to_netcdf and not lnetcdf):
+            print("netCDF4 is not installed!\nto_netcdf will not work")
+            return
+
+        if(to_netcdf and (clim_mean or self.par in RASTERNCDICT)):
+            print("Only monthly ASCII grids can be saved to NetCDF, data is stored as it is")
+            to_netcdf = False
+
+        dates      = self.create_raster_dates(year,month,clim_mean=clim_mean)
+        pathremote = self.create_raster_pathremote(clim_mean=clim_mean)
+
+        # Are the pathes there
+        check_create_dir(self.pathdlocal)
+
+        ii = 0
+        i_tot = len(dates)
+        not_in_list = []
+        cube = None
+
+        metaftp = self.pool.acquire(SERVERNAME)
+        broken  = True
+        try:
+            metaftp.cwd_ftp(pathremote)
+
+            for tyear, tmonth in dates:
+                update_progress(ii/i_tot)
+                ii = ii + 1
+                filename = self.create_raster_filename(tyear,tmonth,clim_mean=clim_mean)
+
+                try:
+                    content = self.fetch_raster_month(metaftp,tyear,tmonth,clim_mean=clim_mean,to_netcdf=to_netcdf)
+                except Exception as Excp:
+                    if(self.debug):
+                        print(Excp)
+                    print(f"{pathremote+filename} not found")
+                    not_in_list.append(pathremote+filename)
+                    continue
+
+                if(to_netcdf):
+                    try:
+                        cube = self.write_raster_cube(cube,tyear,tmonth,content)
+                    except Exception as Excp:
+                        print(Excp)
+                        print(f'{filename} could not be written to NetCDF')
+
+            broken = False
+        finally:
+            # connection which failed (e.g. cwd) is not reused
+            self.pool.release(metaftp,broken=broken)
+
+            if(cube is not None):
+                cube.close()
+
+        # attach all files which are not found
+        self.stations_not_found = not_in_list
+
+    def create_raster_dates(self,year,month,clim_mean=False):
+        """ Returns list of (year, month) of raster data to retrieve
+            year, month and clim_mean like retrieve_dwd_raster
         """
 
         if(clim_mean and not isinstance(year,list)):
@@ -528,70 +819,41 @@ class dow_handler(dict):
                 print(f"and month {month}")
             month_arange = np.array([month])
 
-        if(clim_mean):
-            # save temporarly remote file location
-            pathremotetmp = self.pathremote
-            # replace resolution part with multi_annual
-            self.pathremote = self.pathremote.replace(f'{self.resolution}','multi_annual')
-
-        # Are the pathes there
-        check_create_dir(self.pathdlocal)
-        os.chdir(self.pathdlocal)
-
-        if(to_netcdf):
-            check_create_dir(self.pathdlocaltmp)
-            os.chdir(self.pathdlocaltmp)
-
-        metaftp = cftp(SERVERNAME)
-        metaftp.open_ftp()
-        metaftp.cwd_ftp(self.pathremote)
-
-        ii = 0
-        i_tot = len(year_arange)*len(month_arange)
-        not_in_list = []
-
-        for tyear in year_arange:
-            for tmonth in month_arange:
-                update_progress(ii/i_tot)
-                ii = ii + 1
-                filename = self.create_raster_filename(tyear,tmonth,clim_mean=clim_mean)
-
-                if(self.debug):
-                    print(f"Retrieve: {self.pathremote+filename}")
+        return [(int(tyear), int(tmonth)) for tyear in year_arange for tmonth in month_arange]
 
-                try:
-                    if(self.par in RASTERMONTHSUB and not clim_mean):
-                        metaftp.save_file(filename,filename[7:])
-                    else:
-                        metaftp.save_file(filename,filename)
-                except:
-                    print(f"{self.pathremote+filename} not found")
-                    not_in_list.append(self.pathremote+filename)
-
-                try:
-                    if(self.par in RASTERMONTHSUB and not clim_mean):
-                        os.system('gunzip -f '+filename[7:])
-                    elif(self.par not in RASTERNCDICT): ### Files with nc ending are not needed to unzip
-                        os.system('gunzip -f '+filename)
-                except:
-                    print(f'{filename} could not gunziped --> Is gunzip installed on local machine?')
-                    print('Python intern gunzip not yet implemented!')
+    def create_raster_pathremote(self,clim_mean=False):
+        """ Remote directory of raster data, climate normal periods are in multi_annual """
 
-        # attach all files which are not found
-        self.stations_not_found = not_in_list
         if(clim_mean):
-            # reset remote path again
-            self.pathremote = pathremotetmp
+            # replace resolution part with multi_annual
+            return self.pathremote.replace(f'{self.resolution}','multi_annual')
+        else:
+            return self.pathremote
+
+    def fetch_raster_month(self,metaftp,year,month,clim_mean=False,to_netcdf=False):
+        """ Downloads grid of year and month to pathdlocal
+            ASCII grids are decompressed while they are downloaded
+            metaftp:   ftp connection in remote directory (see create_raster_pathremote)
+            to_netcdf: grid is not saved, its content is returned
+            returns content of ASCII grid as string with to_netcdf, otherwise None
+        """
 
-        metaftp.close_ftp()
+        filename = self.create_raster_filename(year,month,clim_mean=clim_mean)
 
-        os.chdir(self.home_dir)
+        if(self.debug):
+            print(f"Retrieve: {filename}")
 
-        if(to_netcdf):
-            try:
-                shutil.rmtree(self.pathdlocaltmp)
-            except OSError as e:
-                print(f"Error: {self.pathdlocaltmp} : {e.strerror}")
+        if(self.par in RASTERMONTHSUB and not clim_mean):
+            localname = filename[7:]
+        else:
+            localname = filename
+
+        if(self.par in RASTERNCDICT): ### Files with nc ending are not compressed
+            metaftp.save_file(filename,self.pathdlocal+localname)
+        elif(to_netcdf): ### grid is only written to NetCDF file
+            return metaftp.retr_bytes(filename,decompress='gzip').getvalue().decode('latin-1')
+        else:
+            metaftp.save_file(filename,self.pathdlocal+localname[:-3],decompress='gzip')
 
     def read_dwd_regavg(self,cyears=1961,cyeare=1990):
         """ Reads DWD Raster data
@@ -686,15 +948,48 @@ class dow_handler(dict):
 
         return df_out
 
-    def read_dwd_raster(self,year,month,netcdf=False,calc_dev=False,clim_mean=False,clim_year_s=None):
+    def create_raster_cube_filename(self):
+        """ Creates file name of NetCDF file with all monthly grids of parameter """
+        return self.pathdlocal+RASTERCUBEFILE.format(resolution=self.resolution,par=self.par)
+
+    def write_raster_cube(self,cube,year,month,content):
+        """ Parses ASCII grid of year and month and writes it to NetCDF file
+            cube: opened raster_cube or None --> file is opened (and created with grid of first month)
+            content: content of ASCII grid as string
+            returns opened raster_cube
+        """
+
+        data = self.parse_raster_ascii(content)
+
+        if(cube is None):
+            cube = raster_cube(self.create_raster_cube_filename(),self.par,mode='a')
+
+        if(not cube.lcreated):
+            header = {'ncols':self.rncols,'nrows':self.rnrows,
+                      'xllcorner':self.xllcorner,'yllcorner':self.yllcorner,
+                      'cellsize':self.rcellsize,'nodata_value':self.missingval}
+            # lon lat are only available with pyproj or cached grid
+            self.rlons = None
+            self.rlats = None
+            self.create_grid()
+            cube.create(header,self.crs_in,self.gridx,self.gridy,self.rlons,self.rlats)
+
+        cube.write_month(year,month,data)
+
+        return cube
+
+    def read_dwd_raster(self,year,month,netcdf=False,calc_dev=False,clim_mean=False,clim_year_s=None,dtype=np.float64):
         """ Read DWD Raster data
             year:  can be a single year or a list with starting year and end year;
                    [2000,2010] means download data from 2000 to 2010
             month: can be a single month or a list with starting month and end month
                    [1,4] means download data from January to February
-            netcdf: True/False; read data from netCDF File -- Not Yet implemented!! --
+            netcdf: True/False; read data from NetCDF file written by retrieve_dwd_raster(to_netcdf=True),
+                    only the requested months are read
             clim_mean: Reads climatic normal period --> first year of 30 year period must be given
             calc_dev: Calculates deviation --> first year of 30 year period must be given
+            dtype: type of returned arrays (default np.float64), np.float32 halves the memory
+                   for long periods use read_dwd_raster_lazy
         """
 
         if(isinstance(year, list)):
@@ -715,79 +1010,69 @@ class dow_handler(dict):
                 print(f"and month {month}")
             month_arange = np.array([month])
 
-        data_clim = []
         if(clim_mean or calc_dev):
             if(clim_year_s is None):
                 print(f"Please specify clim_year_s")
                 return
 
+            # set climate normal years to class
+            self.clim_y_s = clim_year_s
+            self.clim_y_e = clim_year_s + 29
+
+        if(clim_mean and not calc_dev):
+            data_clim = []
             for tmonth in month_arange:
                 filename = self.create_raster_filename(clim_year_s,tmonth,readf=True,clim_mean=clim_mean)
-                # set climate normal years to class
-                self.clim_y_s = clim_year_s
-                self.clim_y_e = clim_year_s + 29
                 data_clim.append(self.read_raster_ascii(self.pathdlocal+filename))
-                #data_clim = self.read_raster_ascii(self.pathdlocal+filename)
-            data_clim = np.asarray(data_clim,dtype=np.float64)
+            data_clim = np.asarray(data_clim,dtype=dtype)
             data_clim = np.ma.masked_where(data_clim == self.missingval,data_clim)
-            if(not calc_dev):
-                if(self.par in RASTERFACTDICT.keys()):
-                    data_clim *= RASTERFACTDICT[self.par]
-                return data_clim
-
-        data_r = []
-        data_r_anom = [] # !! TODO! Add climate normal periods to calculate deviations
-        i_tot = len(year_arange)*len(month_arange)
-        lfirst = True ## needed to create multiarray in first place
-        ii = 0
-        for tyear in year_arange:
-            imonth = 0
-            for tmonth in month_arange:
-                filename = self.create_raster_filename(tyear,tmonth,readf=True)
-                if(netcdf):
-                    pass
-                else:
-                    data_tmp = self.read_raster_ascii(self.pathdlocal+filename)
-                    try:
-                        #data_r.append(self.read_raster_ascii(self.pathdlocal+filename))
-                        data_tmp = self.read_raster_ascii(self.pathdlocal+filename)
-                    except:
-                        #data_r.append(np.full((self.rnrows,self.rncols),self.missingval))
-                        data_tmp = np.full((self.rncols,self.rnrows),self.missingval)
-
-                data_tmp = np.ma.masked_where(data_tmp == self.missingval, data_tmp)
-
-                if(lfirst):
-                    data_r = np.full((i_tot,self.rncols,self.rnrows),self.missingval)
-                    if(calc_dev):
-                        data_r_anom = np.full((i_tot,self.rncols,self.rnrows),self.missingval)
-                    lfirst = False
-                data_r[ii] = data_tmp
-
-                if(calc_dev):
-                    data_r_anom[ii] = data_r[ii] - data_clim[imonth]
-
-                imonth += 1
-                ii += 1
-
-        # mask data with Fill Value
-        data_r_m = np.ma.masked_where(data_r==self.missingval,data_r)
-        if(calc_dev):
-            data_r_anom_m = np.ma.masked_where(data_r_anom==self.missingval,data_r_anom)
-
-        # is it necessary to multiply data with a factor?
-        if(self.par in RASTERFACTDICT.keys()):
-            data_r_m *= RASTERFACTDICT[self.par]
-            if(calc_dev):
-                data_r_anom_m *= RASTERFACTDICT[self.par]
-
-        if(calc_dev):
-            return data_r_m, data_r_anom_m
-        else:
-            return data_r_m
+            if(self.par in RASTERFACTDICT.keys()):
+                data_clim *= RASTERFACTDICT[self.par]
+            return data_clim
 
-    def set_raster_grid(self):
-        """ Creates grid with lon lat for DWD ASCII Grid"""
+        if(netcdf and not self.check_raster_cube()):
+            return
+
+        with raster_series(self,year,month,netcdf=netcdf,calc_dev=calc_dev,clim_mean=clim_mean,
+                           clim_year_s=clim_year_s,dtype=dtype) as series:
+            return series.to_array()
+
+    def read_dwd_raster_lazy(self,year,month,netcdf=False,calc_dev=False,clim_mean=False,clim_year_s=None,dtype=np.float32):
+        """ Lazy version of read_dwd_raster, grids are only read when they are needed
+            Memory is bounded to a few grids, no matter how long the period is
+            year, month, netcdf, calc_dev, clim_mean and clim_year_s like read_dwd_raster
+            dtype: type of grids (default np.float32)
+            returns raster_series, iterating yields grid or (grid, deviation) of each month;
+                    series.mean() averages over time and series[i] reads the i-th month
+        """
+
+        if(calc_dev and clim_year_s is None):
+            print(f"Please specify clim_year_s")
+            return
+
+        if(netcdf and not self.check_raster_cube()):
+            return
+
+        return raster_series(self,year,month,netcdf=netcdf,calc_dev=calc_dev,clim_mean=clim_mean,
+                             clim_year_s=clim_year_s,dtype=dtype)
+
+    def check_raster_cube(self):
+        """ Checks if NetCDF file of raster data can be read """
+
+        if(not lnetcdf):
+            print("netCDF4 is not installed!\nnetcdf will not work")
+            return False
+        if(not os.path.isfile(self.create_raster_cube_filename())):
+            print(f"{self.create_raster_cube_filename()} not found")
+            print("Retrieve data with dow_handler.retrieve_dwd_raster(to_netcdf=True)")
+            return False
+
+        return True
+
+    def set_raster_grid(self,use_cache=True):
+        """ Creates grid with lon lat for DWD ASCII Grid
+            use_cache: load grid from cache in base_dir if available and store it otherwise (default True)
+        """
 
         # Check first if data was read
         try:
@@ -799,13 +1084,33 @@ class dow_handler(dict):
 
         if(self.debug):
             print("Create Grid")
-        self.create_grid()
+        self.create_grid(use_cache=use_cache)
 
-    def create_grid(self):
+    def create_grid(self,use_cache=True):
         """ Returns four arrays with 1D x-y and 2D xx-yy coordinates
             uses projection of raster and project to lon lat
+            use_cache: The lon lat grid is stored in base_dir and loaded again by later calls
+                       with the same crs, origin, cell size and shape (default True)
         """
 
+        grid_x = self.xllcorner + self.rcellsize * np.arange(self.rncols)
+        grid_y = self.yllcorner + self.rcellsize * np.arange(self.rnrows)
+
+        self.gridx = grid_x 
+        self.gridy = grid_y
+
+        fil_cache = self.base_dir+RASTER_FOLDER+GRIDCACHE_FOLDER+\
+                    f"grid_{self.crs_in.replace(':','')}_{self.xllcorner}_{self.yllcorner}_"\
+                    f"{self.rcellsize}_{self.rncols}x{self.rnrows}.npz"
+
+        if(use_cache and os.path.isfile(fil_cache)):
+            if(self.debug):
+                print(f"Load grid from {fil_cache}")
+            with np.load(fil_cache) as grid_cache:
+                self.rlons = grid_cache['lons']
+                self.rlats = grid_cache['lats']
+            return
+
         if(not lproj):
             print("pyproj seems not installed; Return")
             return
@@ -813,42 +1118,26 @@ class dow_handler(dict):
         inProj  = Proj({'init': f'{self.crs_in}'})
         outProj = Proj({'init': 'epsg:4326'})
 
+        # 2D coordinates with shape (ncols, nrows) like the raster data
+        grid_xx, grid_yy = np.meshgrid(grid_x, grid_y, indexing='ij')
+
+        # Transform all grid cells in one call
         if(ltransform):
             transformer = Transformer.from_proj(inProj,outProj)
-
-            transform = transformer.transform
-
-        grid_x = np.zeros((self.rncols))
-        grid_y = np.zeros((self.rnrows))
-
-        for ii in range(self.rncols):
-            grid_x[ii] = self.xllcorner + self.rcellsize * ii
-
-        for ii in range(self.rnrows):
-            grid_y[ii] = self.yllcorner + self.rcellsize * ii
-
-        lons = np.zeros((self.rncols,self.rnrows))
-        lats = np.zeros((self.rncols,self.rnrows))
-
-        
-        # Fill 2D lon lat arrays with values
-        for ii in range(self.rncols):
-            for jj in range(self.rnrows):
-                #tmp_lon, tmp_lat = transform(grid_x[ii],grid_y[jj])
-                if(ltransform):
-                    lons[ii,jj], lats[ii,jj] = transform(grid_x[ii],grid_y[jj])
-                else:
-                    lons[ii,jj], lats[ii,jj] = pyproj.transform(inProj, outProj, grid_x[ii],grid_y[jj])
-
-
-            update_progress(ii/self.rncols)
-
-        self.gridx = grid_x 
-        self.gridy = grid_y
+            lons, lats = transformer.transform(grid_xx,grid_yy)
+        else:
+            lons, lats = pyproj.transform(inProj, outProj, grid_xx, grid_yy)
 
         self.rlons = lons
         self.rlats = lats
 
+        if(use_cache):
+            try:
+                check_create_dir(self.base_dir+RASTER_FOLDER+GRIDCACHE_FOLDER)
+                np.savez(fil_cache,lons=lons,lats=lats)
+            except OSError as e:
+                print(f"Grid could not be cached: {e}")
+
     def read_raster_ascii(self,filename):
         """ Reads ASCII data from DWD Raster data
             Saves lower left and right corner to class
@@ -860,31 +1149,31 @@ class dow_handler(dict):
             print(f'Read\n{filename}')
 
         with open(filename) as f:
-            content = f.readlines()
+            return self.parse_raster_ascii(f.read())
+
+    def parse_raster_ascii(self,content):
+        """ Parses content of ASCII grid, grid properties are saved to class like read_raster_ascii
+            returns data with shape (ncols, nrows)
+        """
+
+        header, np_data = parse_ascii_grid(content)
 
         # safe number of columns and rows
-        self.rncols = int(content[0].split()[1])
-        self.rnrows = int(content[1].split()[1])
+        self.rncols = header['ncols']
+        self.rnrows = header['nrows']
 
         # safe lower left and lower right corner
-        self.xllcorner = float(content[2].split()[1])
-        self.yllcorner = float(content[3].split()[1])
+        self.xllcorner = header['xllcorner']
+        self.yllcorner = header['yllcorner']
 
         # safe cell size 
-        self.rcellsize = float(content[4].split()[1])
+        self.rcellsize = header['cellsize']
 
         # safe missing value
-        self.missingval = float(content[5].split()[1])
+        self.missingval = header['nodata_value']
 
         self.crs_in = ASCIIRASCRS
 
-        # create data array
-        data = []
-
-        # parse each line, skip header
-        for line in content[6:]: # skip header
-            data.append(line.split())  # splits whitespace and appends row to data
-
         if(self.debug):
             print("File props")
             print(f"ncols: {self.rncols}")
@@ -894,22 +1183,24 @@ class dow_handler(dict):
             print(f"cellsize: {self.rcellsize}")
             print(f"fillVal: {self.missingval}")
 
-        # convert to float
-        [[float(y) for y in x] for x in data]
-
-        # convert data to numpy arr
-        new_data = [[float(string) for string in inner] for inner in data]
-        np_data = np.asarray(new_data)
-
         # data is upside down --> flip it and transpose
         np_data = np_data[::-1,:].T
 
         return np_data
 
-    def retrieve_dwd_station(self,key_arr,to_sqlite=True,**kwargs):
+    def retrieve_dwd_station(self,key_arr,to_sqlite=True,workers=None,bulk_load=False,**kwargs):
         """ Retrieves DWD Station data 
             key_arr:   IDs of stations to retrieve, 1D-Array
             to_sqlite: Saves data within SQLITE databank
+            workers:   Number of parallel ftp sessions to download data (default None --> serial download)
+                       Every worker uses its own ftp connection, data is written by the calling thread only
+                       The number is limited by the size of the ftp connection pool
+            bulk_load: Write all stations in one transaction and tune SQLite for loading (no fsync,
+                       bigger cache). Faster for big historical downloads, but a crash may lose the
+                       whole transaction. Default False
+            The archives of the stations are looked up in the cached listing of the remote directory
+            (see plan_dwd_station), stations without archive are kept in keys_not_found and
+            as pathremote+ID in stations_not_found (like archives which could not be retrieved)
         """
 
         # test types of input parameters
@@ -917,18 +1208,130 @@ class dow_handler(dict):
 
         print(f"Len key_arr {len(key_arr)}")
 
-        check_create_dir(self.pathdlocal)
-        check_create_dir(self.pathdlocaltmp)
+        con = self.open_station_table(bulk_load=bulk_load)
+        if(con is None):
+            return
 
-        os.chdir(self.pathdlocaltmp)
+        plan = self.plan_dwd_station(key_arr)
+        if(plan is None): # no listing --> file names are guessed
+            file_arr = [self.create_station_filename(key) for key in key_arr]
+            self.keys_not_found = []
+        else:
+            file_arr = plan['files']
+            self.keys_not_found = plan['missing']
+            print(f"{len(file_arr)} archives ({plan['bytes']/1024./1024.:.1f} MB) to retrieve")
+            for key in plan['missing']:
+                print(f"No archive of station {key} in {self.pathremote}")
+
+        try:
+            if(workers is not None and workers > 1):
+                not_in_list = self.retrieve_dwd_station_pool(file_arr,con,workers,bulk_load=bulk_load)
+            else:
+                not_in_list = self.retrieve_dwd_station_serial(file_arr,con,bulk_load=bulk_load)
+
+            # stations without archive in listing are reported like archives which failed,
+            # with ID instead of file name (names of historical archives are only guessed)
+            self.stations_not_found = [f'{self.pathremote}{key}' for key in self.keys_not_found] + not_in_list
+
+            if(bulk_load):
+                con.commit()
+        finally:
+            close_database(con, self.driver)
+
+    def sync_dwd_station(self,key_arr=None,workers=None,bulk_load=False):
+        """ Synchronises station data with DWD server
+            Only archives which changed upstream (size or modification time) since the last
+            sync are downloaded and written. The state is kept in table SYNCMANIFESTTAB
+            of the station database.
+            key_arr: IDs of stations to synchronise, default None --> all archives in remote directory
+            workers: Number of parallel ftp sessions (see retrieve_dwd_station)
+            bulk_load: Write everything in one transaction (see retrieve_dwd_station)
+            returns dictionary with lists of fetched, skipped and failed files and
+                    the number of bytes fetched and skipped
+        """
 
-        metaftp = cftp(SERVERNAME)
-        metaftp.open_ftp()
-        metaftp.cwd_ftp(self.pathremote)
+        if(self.dtype != 'station'):
+            print(f"Sync is only available for station data, not for {self.dtype}")
+            return
 
-        ii = 0
-        i_tot = float(len(key_arr))
-        not_in_list = []
+        # changes upstream are only seen with a new listing
+        remote_files = self.get_remote_files(refresh=True)
+
+        if(key_arr is None):
+            remote_files = {name: facts for name, facts in remote_files.items() if name.endswith('.zip')}
+        else:
+            index = self.create_station_file_index(remote_files)
+            remote_files = {name: remote_files[name] for key in key_arr
+                            for name in index.get(f'{int(key):05d}',[])}
+
+        con = self.open_station_table(bulk_load=bulk_load)
+        if(con is None):
+            return
+
+        create_table_manifest(con, self.driver)
+        manifest = read_manifest(con, self.pathremote, self.driver)
+
+        file_arr = []
+        skipped  = []
+        for name in sorted(remote_files):
+            if(manifest.get(name) == remote_files[name]):
+                skipped.append(name)
+            else:
+                file_arr.append(name)
+
+        if(self.debug):
+            print(f"{len(file_arr)} of {len(remote_files)} archives changed")
+
+        # the Parquet manifest is one file, which is rewritten by each write,
+        # so its entries are collected and written once after all archives
+        manifest_entries = []
+
+        def on_write(filename, nbytes, checksum):
+            size, mtime = remote_files[filename]
+            if(self.driver in [PARQUET_DRIVER]):
+                manifest_entries.append((filename, size, mtime, checksum))
+            else:
+                write_manifest(con, self.pathremote, filename, size, mtime, checksum, self.driver,
+                               commit=not bulk_load)
+
+        try:
+            if(workers is not None and workers > 1):
+                not_in_list = self.retrieve_dwd_station_pool(file_arr,con,workers,on_write=on_write,bulk_load=bulk_load)
+            else:
+                not_in_list = self.retrieve_dwd_station_serial(file_arr,con,on_write=on_write,bulk_load=bulk_load)
+        finally:
+            write_manifests(con, self.pathremote, manifest_entries, self.driver, commit=not bulk_load)
+
+        if(bulk_load):
+            con.commit()
+
+        close_database(con, self.driver)
+
+        self.stations_not_found = not_in_list
+
+        failed     = [filename[len(self.pathremote):] for filename in not_in_list]
+        failed_set = set(failed)
+        fetched    = [filename for filename in file_arr if filename not in failed_set]
+
+        summary = {'fetched':fetched,
+                   'skipped':skipped,
+                   'failed':failed,
+                   'bytes_fetched':sum(remote_files[name][0] for name in fetched),
+                   'bytes_skipped':sum(remote_files[name][0] for name in skipped)}
+
+        print(f"Sync {self.pathremote}: {len(fetched)} fetched ({summary['bytes_fetched']/1024./1024.:.1f} MB), "
+              f"{len(skipped)} skipped ({summary['bytes_skipped']/1024./1024.:.1f} MB saved), "
+              f"{len(failed)} failed")
+
+        return summary
+
+    def open_station_table(self,bulk_load=False):
+        """ Opens station database and creates table self.tabname if necessary
+            bulk_load: open SQLite database with settings for bulk loads (default False)
+            returns connection or None if table could not be created
+        """
+
+        check_create_dir(self.pathdlocal)
 
         filenamesql = 'file:{}?cache=shared'.format(self.pathdlocal+SQLITEFILESTAT)
 
@@ -937,7 +1340,8 @@ class dow_handler(dict):
                             dbschema=self.dbschema,
                             debug=self.debug,
                             config_dir=self.config_dir,
-                            postfile=self.dbconfigfile)
+                            postfile=self.dbconfigfile,
+                            bulk_load=bulk_load)
 
         if(check_for_table(con,self.tabname,self.driver)):
             print(f"Table {self.tabname} exists")
@@ -949,49 +1353,405 @@ class dow_handler(dict):
         if(lcreate):
             if(not create_table_res(con,self.resolution, self.par,self.driver, schema=self.dbschema)):
                 return
+        else:
+            # tables of older versions have no index yet
+            create_station_index(con,self.tabname,self.driver)
 
-        for key in key_arr:
+        return con
+
+    def fetch_station_archive(self,metaftp,filename):
+        """ Downloads station archive in memory and reads it
+            archives are never written to disk
+            metaftp:  ftp connection in remote directory
+            filename: name of archive
+            returns DataFrame, size of archive in bytes and md5 checksum of archive
+        """
+
+        buffer = metaftp.retr_bytes(filename)
+        checksum = hashlib.md5(buffer.getbuffer()).hexdigest()
+
+        return self.get_station_df_zip(buffer), buffer.getbuffer().nbytes, checksum
+
+    def retrieve_dwd_station_serial(self,file_arr,con,on_write=None,bulk_load=False):
+        """ Downloads station data one after another with one ftp session
+            file_arr: names of archives to retrieve
+            con:      open database connection
+            on_write: function(filename, nbytes, checksum) called after data is written (default None)
+            bulk_load: do not commit after each station (default False)
+            returns list of files which could not be retrieved
+        """
+
+        ii = 0
+        i_tot = float(len(file_arr))
+        not_in_list = []
+
+        metaftp = self.pool.acquire(SERVERNAME)
+        broken  = True
+        try:
+            metaftp.cwd_ftp(self.pathremote)
+
+            for filename in file_arr:
+                update_progress(ii/i_tot)
+                ii = ii + 1
+                if(self.debug):
+                    print(f"Retrieve: {self.pathremote+filename}")
+
+                try: 
+                    df_tmp, nbytes, checksum = self.fetch_station_archive(metaftp,filename)
+                    # prepare date to split into year month day ...
+                    self.df_tmp = df_tmp
+                    write_sqlite_data(df_tmp, con, self.tabname, self.driver, commit=not bulk_load)
+                    if(on_write is not None):
+                        on_write(filename, nbytes, checksum)
+                except Exception as Excp:
+                    print(Excp)
+                    print(f"{self.pathremote+filename} not found\n")
+                    not_in_list.append(self.pathremote+filename)
+
+            broken = False
+        finally:
+            # connection which failed (e.g. cwd) is not reused
+            self.pool.release(metaftp,broken=broken)
+
+        return not_in_list
+
+    def retrieve_dwd_station_pool(self,file_arr,con,workers,on_write=None,bulk_load=False):
+        """ Downloads station data with a pool of ftp sessions
+            Every worker thread borrows one connection from the pool of the transport (self.pool) and puts the parsed DataFrames into a queue.
+            The calling thread is the only one which writes to the database.
+            file_arr: names of archives to retrieve
+            con:      open database connection
+            workers:  number of parallel ftp sessions
+            on_write: function(filename, nbytes, checksum) called after data is written (default None)
+            bulk_load: do not commit after each station (default False)
+            returns list of files which could not be retrieved (same order as file_arr)
+            An unexpected error of a worker is raised after all other workers finished
+        """
+
+        # more workers than pooled connections would only wait for each other
+        workers = min(workers,len(file_arr),self.pool.max_size)
+        if(workers < 1):
+            return []
+
+        file_queue = queue.Queue()
+        for filename in file_arr:
+            file_queue.put(filename)
+        for iworker in range(workers):
+            file_queue.put(None) # stop signal for each worker
+
+        # bounded, so workers wait if writing is slower than downloading
+        result_queue = queue.Queue(maxsize=2*workers)
+
+        self.worker_stats = [{'files':0,'bytes':0,'time':0.} for iworker in range(workers)]
+
+        threads = []
+        for iworker in range(workers):
+            thread = threading.Thread(target=self.station_download_worker,
+                                      args=(iworker,file_queue,result_queue),
+                                      daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        ii = 0
+        i_tot = float(len(file_arr))
+        not_in_set = set()
+        excp_workers = []
+        active = workers
+        while(active > 0):
+            result = result_queue.get()
+            if(result is None): # worker finished
+                active -= 1
+                continue
+            if(isinstance(result, BaseException)): # worker failed, the others go on with its files
+                excp_workers.append(result)
+                active -= 1
+                continue
+
+            filename, df_tmp, nbytes, checksum, excp = result
             update_progress(ii/i_tot)
             ii = ii + 1
-            filename = self.create_station_filename(key)
-            check_create_dir(key)
-            os.chdir(key)
-            if(self.debug):
-                print(f"Retrieve: {self.pathremote+filename}")
 
-            try: 
-                metaftp.save_file(filename,filename)
-                unzip_file(filename)
-                df_tmp = self.get_station_df_csv(os.getcwd())
-                # prepare date to split into year month day ...
-                self.df_tmp = df_tmp
-                write_sqlite_data(df_tmp, con, self.tabname, self.driver)
-            except Exception as Excp:
-                print(Excp)
+            if(excp is None):
+                try:
+                    self.df_tmp = df_tmp
+                    write_sqlite_data(df_tmp, con, self.tabname, self.driver, commit=not bulk_load)
+                    if(on_write is not None):
+                        on_write(filename, nbytes, checksum)
+                except Exception as Excp:
+                    excp = Excp
+
+            if(excp is not None):
+                print(excp)
                 print(f"{self.pathremote+filename} not found\n")
-                not_in_list.append(self.pathremote+filename)
-            os.chdir('../')
+                not_in_set.add(filename)
 
-        self.stations_not_found = not_in_list
+        for thread in threads:
+            thread.join()
 
-        metaftp.close_ftp()
+        if(len(excp_workers) > 0):
+            raise excp_workers[0]
 
-        close_database(con, self.driver)
+        # files which were left in queue, because no worker was able to connect
+        while(not file_queue.empty()):
+            filename = file_queue.get()
+            if(filename is not None):
+                not_in_set.add(filename)
+
+        for iworker, stats in enumerate(self.worker_stats):
+            mbytes = stats['bytes']/1024./1024.
+            if(stats['time'] > 0):
+                rate = mbytes/stats['time']
+            else:
+                rate = 0.
+            print(f"Worker {iworker}: {stats['files']} files, {mbytes:.1f} MB in {stats['time']:.1f} s ({rate:.2f} MB/s)")
+
+        return [self.pathremote+filename for filename in file_arr if filename in not_in_set]
+
+    def station_download_worker(self,iworker,file_queue,result_queue):
+        """ Worker of retrieve_dwd_station_pool
+            Downloads and parses station data until it gets a stop signal (None) from file_queue
+            Archives are read in memory, so nothing is written to disk
+            When it stops it puts None into result_queue, or the exception if it failed unexpectedly
+        """
 
-        os.chdir(self.home_dir)
+        stats = self.worker_stats[iworker]
 
+        metaftp = None
+        broken  = False
+        excp_worker = None
         try:
-            shutil.rmtree(self.pathdlocaltmp)
-        except OSError as e:
-            print(f"Error: {self.pathdlocaltmp} : {e.strerror}")
+            try:
+                metaftp = self.pool.acquire(SERVERNAME)
+                metaftp.cwd_ftp(self.pathremote)
+            except Exception as Excp:
+                print(f"Worker {iworker} could not connect: {Excp}")
+                broken = True
+                return
+
+            while(True):
+                filename = file_queue.get()
+                if(filename is None):
+                    break
+
+                if(self.debug):
+                    print(f"Worker {iworker} retrieve: {self.pathremote+filename}")
+
+                ts = time.time()
+                try:
+                    df_tmp, nbytes, checksum = self.fetch_station_archive(metaftp,filename)
+                    stats['bytes'] += nbytes
+                    stats['files'] += 1
+                    result = (filename, df_tmp, nbytes, checksum, None)
+                except Exception as Excp:
+                    result = (filename, None, 0, None, Excp)
+                stats['time'] += time.time() - ts
+
+                result_queue.put(result)
+        except BaseException as Excp:
+            broken = True
+            excp_worker = Excp
+        finally:
+            if(metaftp is not None):
+                self.pool.release(metaftp,broken=broken)
+            # the calling thread waits for one stop signal of each worker
+            result_queue.put(excp_worker)
+
+    def fetch_station_archive_pooled(self,filename):
+        """ fetch_station_archive with a connection borrowed from self.pool """
+
+        metaftp = self.pool.acquire(SERVERNAME)
+        try:
+            metaftp.cwd_ftp(self.pathremote)
+            return self.fetch_station_archive(metaftp,filename)
+        finally:
+            self.pool.release(metaftp)
+
+    def fetch_raster_month_pooled(self,year,month,clim_mean=False,to_netcdf=False):
+        """ fetch_raster_month with a connection borrowed from self.pool """
+
+        metaftp = self.pool.acquire(SERVERNAME)
+        try:
+            metaftp.cwd_ftp(self.create_raster_pathremote(clim_mean=clim_mean))
+            return self.fetch_raster_month(metaftp,year,month,clim_mean=clim_mean,to_netcdf=to_netcdf)
+        finally:
+            self.pool.release(metaftp)
+
+    async def aget_station_metadata(self):
+        """ Async version of get_station_metadata
+            The download runs in a thread, so the event loop is not blocked
+        """
+
+        await run_in_thread(self.get_station_metadata)
+
+    async def aretrieve_dwd_station(self,key_arr,workers=FTPPOOLSIZE,bulk_load=False):
+        """ Async version of retrieve_dwd_station
+            Up to workers archives are downloaded at once, each in a thread with a connection of
+            the transport pool. Parsed archives go through a bounded queue to one writer, so downloads wait
+            if writing is slower (at most 3*workers archives are in memory). The database connection
+            is only used by one thread.
+            key_arr:   IDs of stations to retrieve
+            workers:   number of parallel downloads, default FTPPOOLSIZE (limited by size of self.pool)
+            bulk_load: see retrieve_dwd_station
+        """
+
+        assert isinstance(key_arr, list)
+
+        workers = max(1,min(workers,self.pool.max_size))
+        loop    = asyncio.get_running_loop()
+
+        with ThreadPoolExecutor(max_workers=1) as db_executor:
+            def run_db(func,*args,**kwargs):
+                return loop.run_in_executor(db_executor,functools.partial(func,*args,**kwargs))
+
+            con = await run_db(self.open_station_table,bulk_load=bulk_load)
+            if(con is None):
+                return
 
+            plan = await run_in_thread(self.plan_dwd_station,key_arr)
+            if(plan is None): # no listing --> file names are guessed
+                file_arr = [self.create_station_filename(key) for key in key_arr]
+                self.keys_not_found = []
+            else:
+                file_arr = plan['files']
+                self.keys_not_found = plan['missing']
+
+            semaphore    = asyncio.Semaphore(workers)
+            result_queue = asyncio.Queue(maxsize=2*workers)
+
+            async def download(filename):
+                async with semaphore:
+                    try:
+                        df_tmp, nbytes, checksum = await run_in_thread(self.fetch_station_archive_pooled,filename)
+                        result = (filename, df_tmp, None)
+                    except Exception as Excp:
+                        result = (filename, None, Excp)
+                    # waits while queue is full
+                    await result_queue.put(result)
+
+            async def write():
+                not_in_list = []
+                for ii in range(len(file_arr)):
+                    filename, df_tmp, excp = await result_queue.get()
+
+                    if(excp is None):
+                        try:
+                            await run_db(write_sqlite_data,df_tmp,con,self.tabname,self.driver,commit=not bulk_load)
+                        except Exception as Excp:
+                            excp = Excp
+
+                    if(excp is not None):
+                        print(excp)
+                        print(f"{self.pathremote+filename} not found\n")
+                        not_in_list.append(self.pathremote+filename)
+
+                return not_in_list
+
+            try:
+                results = await asyncio.gather(write(),*[download(filename) for filename in file_arr])
+                self.stations_not_found = [f'{self.pathremote}{key}' for key in self.keys_not_found] + results[0]
+
+                if(bulk_load):
+                    await run_db(con.commit)
+            finally:
+                await run_db(close_database,con,self.driver)
+
+    async def aretrieve_dwd_raster(self,year,month,to_netcdf=False,clim_mean=False,workers=FTPPOOLSIZE):
+        """ Async version of retrieve_dwd_raster
+            Up to workers months are downloaded at once, each in a thread with a connection of the transport pool.
+            With to_netcdf the grids are written by one thread in order of the months.
+            year, month, to_netcdf, clim_mean: see retrieve_dwd_raster
+            workers: number of parallel downloads, default FTPPOOLSIZE (limited by size of self.pool)
+        """
+
+        if(to_netcdf and not lnetcdf):
+            print("netCDF4 is not installed!\nto_netcdf will not work")
+            return
+
+        if(to_netcdf and (clim_mean or self.par in RASTERNCDICT)):
+            print("Only monthly ASCII grids can be saved to NetCDF, data is stored as it is")
+            to_netcdf = False
+
+        dates      = self.create_raster_dates(year,month,clim_mean=clim_mean)
+        pathremote = self.create_raster_pathremote(clim_mean=clim_mean)
+
+        check_create_dir(self.pathdlocal)
 
-    def get_dwd_station_data(self,key,mask_FillVal=True):
-        """ Get Data from sqlite database """
+        workers = max(1,min(workers,self.pool.max_size))
+        loop    = asyncio.get_running_loop()
+
+        with ThreadPoolExecutor(max_workers=1) as nc_executor:
+            semaphore    = asyncio.Semaphore(workers)
+            result_queue = asyncio.Queue(maxsize=2*workers)
+
+            async def download(idate,tyear,tmonth):
+                async with semaphore:
+                    try:
+                        content = await run_in_thread(self.fetch_raster_month_pooled,tyear,tmonth,
+                                                          clim_mean=clim_mean,to_netcdf=to_netcdf)
+                        result = (idate, content, None)
+                    except Exception as Excp:
+                        result = (idate, None, Excp)
+                    await result_queue.put(result)
+
+            async def write():
+                not_in_list = []
+                cube    = None
+                pending = {}
+                inext   = 0
+                for ii in range(len(dates)):
+                    idate, content, excp = await result_queue.get()
+                    tyear, tmonth = dates[idate]
+                    filename = self.create_raster_filename(tyear,tmonth,clim_mean=clim_mean)
+
+                    if(excp is not None):
+                        if(self.debug):
+                            print(excp)
+                        print(f"{pathremote+filename} not found")
+                        not_in_list.append(pathremote+filename)
+                    pending[idate] = content
+
+                    # months are written in order, so the time axis of the NetCDF file is sorted
+                    while(inext in pending):
+                        content = pending.pop(inext)
+                        if(to_netcdf and content is not None):
+                            try:
+                                cube = await loop.run_in_executor(nc_executor,self.write_raster_cube,
+                                                                  cube,*dates[inext],content)
+                            except Exception as Excp:
+                                print(Excp)
+                                print(f'{self.create_raster_filename(*dates[inext])} could not be written to NetCDF')
+                        inext += 1
+
+                if(cube is not None):
+                    await loop.run_in_executor(nc_executor,cube.close)
+
+                return not_in_list
+
+            results = await asyncio.gather(write(),*[download(idate,tyear,tmonth)
+                                                     for idate, (tyear, tmonth) in enumerate(dates)])
+            self.stations_not_found = results[0]
+
+    def get_dwd_station_data(self,key,mask_FillVal=True,
+                             start=None,end=None,
+                             columns=None,qn_min=None,
+                             lint_date=True):
+        """ Get Data from sqlite database
+        Arguments:
+            key:          Station ID
+            mask_FillVal: mask FillValue (True/False --> Default True)
+            start:        first date to read (e.g. '2024-01-01' or datetime), default None --> from beginning
+            end:          last date to read (inclusive), default None --> until end
+            columns:      list of variables to read, default None --> all columns
+            qn_min:       only read rows whose quality level (QN) of the read variables is at least qn_min,
+                          default None --> no filter
+            lint_date:    convert MESS_DATUM with integer arithmetic instead of
+                          parsing strings (default True)
+        """
 
         filename = 'file:{}?cache=shared'.format(self.pathdlocal+SQLITEFILESTAT)
 
         con = open_database(filename, self.ldbsave, self.driver,debug=self.debug,
+                            dbschema=self.dbschema,
                             config_dir=self.config_dir,
                             postfile=self.dbconfigfile)
 
@@ -1000,35 +1760,36 @@ class dow_handler(dict):
         else:
             tabname = f"{self.par}_{self.resolution}"
 
-        sqlexec = "SELECT * from {} WHERE STATIONS_ID = {}".format(tabname,key)
-        if(self.driver in [POSTGRES_DRIVER]):
-            sqlexec = text(sqlexec)
+        if(columns is None):
+            select_vars = '*'
+        else:
+            select_vars = ', '.join(self.create_station_columns(columns))
 
-        if(self.debug):
-            print("Get data:")
-            print(sqlexec)
+        if(self.driver in [PARQUET_DRIVER]):
+            df_data = con.read_table(tabname,columns=self.create_station_columns(columns),
+                                     filters=self.create_station_filter_list([key],start,end,columns,qn_min))
+        else:
+            sqlexec = "SELECT {} from {} WHERE {} = {}".format(select_vars,tabname,STATIONNAMEID,key)
+            sqlexec += self.create_station_filter(start,end,columns,qn_min)
 
-        df_data = pd.read_sql_query(sqlexec, con)
+            if(self.driver in [POSTGRES_DRIVER]):
+                sqlexec = text(sqlexec)
 
-        close_database(con, self.driver)
+            if(self.debug):
+                print("Get data:")
+                print(sqlexec)
 
-        if(self.resolution == 'hourly'):
-            strformat='%Y%m%d%H'
-        if(self.resolution == '10_minutes'):
-            strformat='%Y%m%d%H%M'
-        elif(self.resolution == 'daily'):
-            strformat='%Y%m%d'
-        elif(self.resolution == 'monthly'):
-            strformat='%Y%m'
-        elif(self.resolution == 'yearly'):
-            strformat='%Y'
+            df_data = pd.read_sql_query(sqlexec, con)
+
+        close_database(con, self.driver)
 
         if(self.driver in [POSTGRES_DRIVER]):
             date_string = 'mess_datum'
         else:
             date_string = 'MESS_DATUM'
 
-        df_data.index = pd.to_datetime(df_data[date_string],format=strformat) ## TODO MESS_DATUM durch generisches filedata austauschen
+        df_data.index = self.create_station_dates(df_data[date_string],lint_date) ## TODO MESS_DATUM durch generisches filedata austauschen
+        df_data.index.name = date_string
         df_data.drop(columns=[date_string],inplace=True)
 
         columns = df_data.columns
@@ -1043,14 +1804,214 @@ class dow_handler(dict):
 
         return df_data
 
-    def get_data(self,sqlexec,
+    def get_dwd_stations_data(self,keys,
+                              start=None,end=None,
+                              columns=None,qn_min=None,
+                              mask_FillVal=True,
+                              lwide=False,
+                              chunksize=STATION_IN_CHUNK,
+                              lint_date=True):
+        """ Get Data of many stations from database with few queries
+        Arguments:
+            keys:         list of station IDs
+            start:        first date to read (e.g. '2024-01-01' or datetime), default None --> from beginning
+            end:          last date to read (inclusive), default None --> until end
+            columns:      list of variables to read, default None --> all columns
+            qn_min:       only read rows whose quality level (QN) of the read variables is at least qn_min,
+                          default None --> no filter
+            mask_FillVal: mask FillValue (True/False --> Default True)
+            lwide:        return wide table with dates as index and (variable, station) as columns,
+                          so df['TMK'] has one column per station (default False)
+            chunksize:    number of stations per query (default STATION_IN_CHUNK)
+            lint_date:    see get_dwd_station_data
+        returns
+            DataFrame with (STATIONS_ID, MESS_DATUM) as index, or wide table if lwide
+        """
+
+        filename = 'file:{}?cache=shared'.format(self.pathdlocal+SQLITEFILESTAT)
+
+        con = open_database(filename, self.ldbsave, self.driver,debug=self.debug,
+                            dbschema=self.dbschema,
+                            config_dir=self.config_dir,
+                            postfile=self.dbconfigfile)
+
+        if(self.driver in [POSTGRES_DRIVER]):
+            tabname = f"{self.dbschema}.{self.par}_{self.resolution}"
+        else:
+            tabname = f"{self.par}_{self.resolution}"
+
+        if(columns is None):
+            select_vars = '*'
+        else:
+            select_vars = ', '.join(self.create_station_columns(columns))
+
+        sqlfilter = self.create_station_filter(start,end,columns,qn_min)
+
+        keys = [int(key) for key in keys]
+        df_arr = []
+        if(self.driver in [PARQUET_DRIVER]):
+            # only the partitions of the stations are read, no chunks needed
+            df_arr.append(con.read_table(tabname,columns=self.create_station_columns(columns),
+                                         filters=self.create_station_filter_list(keys,start,end,columns,qn_min)))
+        else:
+            for i in range(0,len(keys),chunksize):
+                key_list = ', '.join([str(key) for key in keys[i:i+chunksize]])
+                sqlexec  = "SELECT {} from {} WHERE {} IN ({})".format(select_vars,tabname,STATIONNAMEID,key_list)
+                sqlexec += sqlfilter
+
+                if(self.driver in [POSTGRES_DRIVER]):
+                    sqlexec = text(sqlexec)
+
+                if(self.debug):
+                    print("Get data:")
+                    print(sqlexec)
+
+                df_arr.append(pd.read_sql_query(sqlexec, con))
+
+        close_database(con, self.driver)
+
+        if(len(df_arr) == 0):
+            df_data = pd.DataFrame(columns=[STATIONNAMEID, DATENAMESTAT])
+        else:
+            df_data = pd.concat(df_arr,ignore_index=True)
+
+        # PostgreSQL returns lower case names
+        replace_col = {var.lower():var for var in STATION_VAR_DICT[self.resolution][self.par]}
+        df_data.columns = [replace_col.get(column.replace(' ','').lower(),column.replace(' ',''))
+                           for column in df_data.columns]
+
+        df_data.index = pd.MultiIndex.from_arrays([df_data[STATIONNAMEID].to_numpy(),
+                                                   self.create_station_dates(df_data[DATENAMESTAT],lint_date)],
+                                                  names=[STATIONNAMEID, DATENAMESTAT])
+        df_data.drop(columns=[STATIONNAMEID, DATENAMESTAT],inplace=True)
+        df_data.sort_index(inplace=True)
+
+        if(mask_FillVal):
+            # only numeric columns can contain FillValue, mask them at once
+            # columns without FillValue keep their type
+            num_cols = df_data.select_dtypes('number').columns
+            values   = df_data[num_cols].to_numpy(dtype=np.float64,na_value=np.nan,copy=True)
+            lfill    = values == FILLVALUE
+            lcol     = lfill.any(axis=0)
+            values[lfill] = np.nan
+            df_data[num_cols[lcol]] = values[:,lcol]
+
+        if(lwide):
+            return df_data.unstack(level=STATIONNAMEID)
+
+        return df_data
+
+    def create_station_dates(self,dates,lint_date=True):
+        """ Converts MESS_DATUM of database to datetime
+            Integers are converted with integer arithmetic (if lint_date), other types are parsed
+            with the date format of the resolution
+        """
+
+        if(lint_date and dates.dtype.kind in 'iu'):
+            return int_to_datetime(dates.to_numpy(),self.resolution)
+        else:
+            return pd.to_datetime(dates.astype(str),format=STATION_DATE_FORMAT[self.resolution])
+
+    def create_station_columns(self,columns=None):
+        """ Columns of station query: station ID and date are always read
+        Arguments:
+            columns: list of variables, default None --> all columns (returns None)
+        """
+
+        if(columns is None):
+            return None
+
+        return [STATIONNAMEID, DATENAMESTAT] + [col for col in columns
+                                                if col not in [STATIONNAMEID, DATENAMESTAT]]
+
+    def station_date_end(self,end):
+        """ Returns first date after end (exclusive bound) in the integer format of MESS_DATUM
+            end is inclusive: a date without time (e.g. '2024-01-05') includes the whole day,
+            also for hourly and 10 minutes data, otherwise the time step of end is included
+        """
+
+        end  = pd.Timestamp(end)
+        freq = STATION_DATE_FREQ[self.resolution]
+
+        if(self.resolution in ['10_minutes','hourly']):
+            if(end == end.normalize()):
+                end_excl = end + pd.Timedelta(days=1)
+            else:
+                step     = pd.Timedelta(freq)
+                end_excl = end.floor(step) + step
+        else:
+            end_excl = (pd.Period(end,freq) + 1).start_time
+
+        return end_excl.strftime(STATION_DATE_FORMAT[self.resolution])
+
+    def create_station_filter_list(self,keys,start=None,end=None,columns=None,qn_min=None):
+        """ Creates filter of station query for Parquet driver, same conditions as create_station_filter
+        Arguments:
+            keys:    list of station IDs
+            start:   first date to read, default None
+            end:     last date to read (inclusive, a date without time includes the whole day), default None
+            columns: list of variables, used to select quality variables, default None
+            qn_min:  minimum quality level, default None
+        returns
+            list of filters in the format of pyarrow.parquet
+        """
+
+        strformat = STATION_DATE_FORMAT[self.resolution]
+        filters   = [(STATIONNAMEID, 'in', [int(key) for key in keys])]
+
+        if(start is not None):
+            filters.append((DATENAMESTAT, '>=', int(pd.Timestamp(start).strftime(strformat))))
+        if(end is not None):
+            filters.append((DATENAMESTAT, '<', int(self.station_date_end(end))))
+
+        if(qn_min is not None):
+            for qn_var in get_quality_vars(self.resolution,self.par,columns):
+                filters.append((qn_var, '>=', qn_min))
+
+        return filters
+
+    def create_station_filter(self,start=None,end=None,columns=None,qn_min=None):
+        """ Creates filter of station query, which is appended to WHERE clause
+        Arguments:
+            start:   first date to read, default None
+            end:     last date to read (inclusive, a date without time includes the whole day), default None
+            columns: list of variables, used to select quality variables, default None
+            qn_min:  minimum quality level, default None
+        returns
+            string like " AND MESS_DATUM >= ... AND MESS_DATUM < ..."
+        """
+
+        strformat = STATION_DATE_FORMAT[self.resolution]
+        sqlfilter = ''
+
+        # date range is compared with integers of MESS_DATUM, so the index on (STATIONS_ID, MESS_DATUM) is used
+        if(start is not None):
+            sqlfilter += " AND {} >= {}".format(DATENAMESTAT,pd.Timestamp(start).strftime(strformat))
+        if(end is not None):
+            sqlfilter += " AND {} < {}".format(DATENAMESTAT,self.station_date_end(end))
+
+        if(qn_min is not None):
+            for qn_var in get_quality_vars(self.resolution,self.par,columns):
+                sqlfilter += " AND {} >= {}".format(qn_var,qn_min)
+
+        return sqlfilter
+
+    def get_data(self,sqlexec=None,
                  ldateindex=True,
-                 mask_fillVal=True):
+                 mask_fillVal=True,
+                 tabname=None,
+                 columns=None,
+                 filters=None):
         """ Get data according to sqlexec
         Arguments:
             sqlexec:      SQLite Query
             ldateindex:   Date ("MESS_DATUM") as index (True/False --> Default True)
             mask_fillVal: mask FillValue (True/False --> Default True)
+            Parquet driver has no SQL, instead following is used:
+            tabname:      table to read, default None --> table of par and resolution
+            columns:      list of columns to read, default None --> all columns
+            filters:      filters in the format of pyarrow.parquet, e.g. [('STATIONS_ID', 'in', [44, 73])],
+                          default None --> all rows
         """
 
         filename = 'file:{}?cache=shared'.format(self.pathdlocal+SQLITEFILESTAT)
@@ -1059,7 +2020,12 @@ class dow_handler(dict):
                             config_dir=self.config_dir,
                             postfile=self.dbconfigfile)
 
-        df_data = pd.read_sql_query(sqlexec, con)
+        if(self.driver in [PARQUET_DRIVER]):
+            if(tabname is None):
+                tabname = f"{self.par}_{self.resolution}"
+            df_data = con.read_table(tabname,columns=columns,filters=filters)
+        else:
+            df_data = pd.read_sql_query(sqlexec, con)
 
         close_database(con, self.driver)
 
@@ -1105,6 +2071,11 @@ class dow_handler(dict):
 
         tabname = f"{self.par}_{self.resolution}"
 
+        if(self.driver in [PARQUET_DRIVER]):
+            # rows with the same key are replaced when they are written
+            close_database(con, self.driver)
+            return
+
         sqlexc = f"DELETE FROM {tabname} "\
                   "WHERE rowid NOT IN "\
                   "(" \
@@ -1125,9 +2096,10 @@ class dow_handler(dict):
         """
         """
 
-        data_files = list_files(dir_in,ending='txt',only_files=True)
+        # full paths are returned, so there is no need to change directory
+        data_files = list_files(dir_in,ending='txt')
         for file in data_files:
-            if('produkt' in file):
+            if('produkt' in os.path.basename(file)):
                 df_tmp = pd.read_csv(file,delimiter=';')
                 break
 
@@ -1141,6 +2113,19 @@ class dow_handler(dict):
 
         return df_tmp
 
+    def get_station_df_zip(self,buffer):
+        """ Reads station data directly from zip archive
+            only the produkt_* member is read, nothing is extracted to disk
+            buffer: zip archive as file like object (e.g. BytesIO) or file name
+        """
+
+        df_tmp = read_zip_csv(buffer,member_start='produkt')
+
+        # remove blanks from column names
+        df_tmp.columns = df_tmp.columns.str.replace(' ','')
+
+        return df_tmp
+
     def get_obj_station(self,key,obj='name'):
         """ Get Metadata of Station Metadatafile """
 
@@ -7,14 +7,32 @@ Created on Sat Jun 06 17:32:40 2021
 @description: Simple FTP handling """
 
 # import library
-from ftplib import FTP
+from ftplib import FTP, error_temp, error_perm
+from io import BytesIO
+import posixpath
+import socket
+import os
+import zlib
+import bz2
+import threading
+import atexit
+import time
+import calendar
+
+from ..constants.serverdata import (FTPTIMEOUT, FTPPOOLSIZE, FTPMAXIDLE, FTPKEEPALIVE,
+                                    FTPRETRIES, FTPBACKOFF, FTPBLOCKSIZE)
 
 class cftp():
-    def __init__(self,url,user=None,passw=None):
+    def __init__(self,url,user=None,passw=None,timeout=FTPTIMEOUT,
+                 retries=FTPRETRIES,backoff=FTPBACKOFF,blocksize=FTPBLOCKSIZE):
         """ Class to handle ftp connections
             url: Destination to open connection
             user: If user credential is needed, default None
             passw: if password credential is needed, default None
+            timeout: seconds until a blocking operation is aborted, default FTPTIMEOUT
+            retries: number of retries of a failed download, default FTPRETRIES
+            backoff: seconds to wait before first retry, doubled for each further retry, default FTPBACKOFF
+            blocksize: block size of downloads in bytes, default FTPBLOCKSIZE
         """
 
         self.url   = url
@@ -27,30 +45,470 @@ class cftp():
         else:
             self.passw = passw
 
+        self.timeout  = timeout
+        self.retries  = retries
+        self.backoff  = backoff
+        self.blocksize = blocksize
+        self.home     = '/'
+        self.location = None
+
     def open_ftp(self):
         """ Opens ftp connection via given url
         """
 
-        self.ftp = FTP(self.url)
+        self.ftp = FTP(self.url,timeout=self.timeout)
         self.ftp.set_pasv(True)
         self.ftp.login(user=self.user,passwd=self.passw)
+        self.home = self.ftp.pwd()
+
+    def reconnect_ftp(self):
+        """ Closes connection and opens it again, the last location is restored """
+
+        try:
+            self.ftp.close()
+        except Exception:
+            pass
+
+        self.open_ftp()
+        if(self.location is not None):
+            self.ftp.cwd(self.location)
+
+    def call_ftp(self,func):
+        """ Calls func and reconnects once if the server closed the connection
+            (421 or timeout)
+            func: function without arguments which uses self.ftp
+        """
+
+        try:
+            return func()
+        except error_temp as Excp:
+            if(not str(Excp).startswith('421')):
+                raise
+        except (EOFError, ConnectionError, socket.timeout):
+            pass
+
+        self.reconnect_ftp()
+        return func()
+
+    def noop_ftp(self):
+        """ Sends NOOP to keep connection alive, returns False if connection is dead """
+
+        try:
+            self.ftp.voidcmd('NOOP')
+            return True
+        except Exception:
+            return False
 
     def cwd_ftp(self,location):
-        """ Change location on ftp connection """
-        self.ftp.cwd(location)
+        """ Change location on ftp connection
+            relative locations are relative to the login directory,
+            so a reused connection ends up in the same directory as a fresh one
+        """
+
+        if(not location.startswith('/')):
+            location = posixpath.join(self.home,location)
+
+        self.call_ftp(lambda: self.ftp.cwd(location))
+        self.location = location
 
     def retr_files_ftp(self):
         """ retrieves files from current dir of ftp connection """
-        return self.ftp.nlst()
+        return self.call_ftp(lambda: self.ftp.nlst())
+
+    def retr_files_facts_ftp(self,ending=None):
+        """ retrieves files of current dir with size and modification time
+            uses MLSD and falls back to NLST with SIZE and MDTM if MLSD is not supported
+            ending: if specified only files with this ending are returned
+            returns dictionary file name --> (size, modification time as YYYYMMDDHHMMSS)
+        """
+
+        def list_mlsd():
+            files = {}
+            for name, facts in self.ftp.mlsd(facts=['type','size','modify']):
+                if(facts.get('type','file') != 'file'):
+                    continue
+                if(ending is not None and not name.endswith(ending)):
+                    continue
+                files[name] = (int(facts.get('size',-1)), facts.get('modify','')[:14])
+            return files
+
+        def list_nlst():
+            files = {}
+            self.ftp.voidcmd('TYPE I') # SIZE is only allowed in binary mode
+            for name in self.ftp.nlst():
+                if(ending is not None and not name.endswith(ending)):
+                    continue
+                try:
+                    size  = self.ftp.size(name)
+                    mtime = self.ftp.sendcmd(f'MDTM {name}')[4:].strip()[:14]
+                except error_perm: # e.g. directories
+                    continue
+                files[name] = (size, mtime)
+            return files
+
+        try:
+            return self.call_ftp(list_mlsd)
+        except error_perm:
+            return self.call_ftp(list_nlst)
 
-    def save_file(self,remote,local):
+    def remote_size(self,remote):
+        """ Returns size of remote file in bytes or None if the server does not support SIZE """
 
-        fil_save = open(local,'wb')
+        def size():
+            self.ftp.voidcmd('TYPE I') # SIZE is only allowed in binary mode
+            return self.ftp.size(remote)
 
-        self.ftp.retrbinary('RETR {}'.format(remote),fil_save.write)
+        try:
+            return self.call_ftp(size)
+        except error_perm:
+            return None
 
-        fil_save.close()
+    def remote_mtime(self,remote):
+        """ Returns modification time of remote file as YYYYMMDDHHMMSS (UTC) or None if the server does not support MDTM """
+
+        try:
+            return self.call_ftp(lambda: self.ftp.sendcmd(f'MDTM {remote}')[4:].strip()[:14])
+        except error_perm:
+            return None
+
+    def retry_ftp(self,func):
+        """ Calls func until it succeeds, at most retries+1 times
+            Before each retry it waits backoff*2**(retry-1) seconds and reconnects
+            Permanent errors (e.g. file not found) are raised at once
+            func: function without arguments which uses self.ftp
+        """
+
+        for iretry in range(self.retries+1):
+            try:
+                return func()
+            except error_perm:
+                raise
+            except (error_temp, EOFError, OSError, ValueError) as Excp:
+                if(iretry == self.retries):
+                    raise
+                print(f"Download failed ({Excp}), retry {iretry+1} of {self.retries}")
+
+            time.sleep(self.backoff*2**iretry)
+            try:
+                self.reconnect_ftp()
+            except Exception:
+                pass # next try fails and is counted
+
+    def save_file(self,remote,local,decompress=None,if_modified=False):
+        """ retrieves remote file and saves it to local
+            The file is written to local.part first and renamed when it is complete,
+            so there are never incomplete files. The size is checked against SIZE of server.
+            An interrupted download is continued (REST) from the end of local.part,
+            also by a later call, if the remote file did not change in between (MDTM is kept
+            in local.part.meta). It is retried with backoff (see retry_ftp).
+            local gets the modification time of the remote file (MDTM).
+            decompress: None, 'gzip' or 'bz2'; the file is decompressed while it is downloaded,
+                        so only the decompressed file is written. The received compressed bytes are
+                        checked against SIZE and the compressed stream has to be complete, there is
+                        no checksum of the server. Such downloads are started again from the beginning
+            if_modified: only download if local does not exist or the remote file is newer, default False
+        """
+
+        partial = local+'.part'
+        meta    = partial+'.meta'
+        mdtm    = self.remote_mtime(remote)
+        mtime   = mtime_to_timestamp(mdtm)
+
+        if(if_modified and mtime is not None and os.path.isfile(local)):
+            if(mtime <= os.path.getmtime(local)):
+                return
+
+        size    = self.remote_size(remote)
+
+        # local.part is only continued if it belongs to the same version of the remote file,
+        # otherwise old and new data would be mixed
+        if(os.path.isfile(partial) and read_part_meta(meta) != (mdtm or '')):
+            os.remove(partial)
+
+        if(decompress is None):
+            with open(meta,'w') as fil_meta:
+                fil_meta.write(mdtm or '')
+
+        def retr():
+            if(decompress is None and os.path.isfile(partial)):
+                offset = os.path.getsize(partial)
+            else:
+                offset = 0
+
+            if(size is not None and offset > size): # remote file changed
+                offset = 0
+
+            nbytes = [offset]
+            def write(block):
+                nbytes[0] += len(block)
+                stream.write(block)
+
+            with open(partial,'ab' if offset > 0 else 'wb') as fil_save:
+                stream = stream_decompressor(fil_save.write,decompress)
+                if(size is None or offset < size):
+                    self.ftp.retrbinary('RETR {}'.format(remote),write,
+                                        blocksize=self.blocksize,rest=offset if offset > 0 else None)
+                stream.close()
+
+            if(size is not None and nbytes[0] != size):
+                raise ValueError(f'{remote}: {nbytes[0]} of {size} bytes received')
+
+        try:
+            self.retry_ftp(retr)
+        except:
+            # decompressed data can not be continued
+            if(os.path.isfile(partial) and (decompress is not None or os.path.getsize(partial) == 0)):
+                os.remove(partial)
+            if(not os.path.isfile(partial) and os.path.isfile(meta)):
+                os.remove(meta)
+            raise
+
+        os.replace(partial,local)
+        if(os.path.isfile(meta)):
+            os.remove(meta)
+
+        set_local_mtime(local,mtime)
+
+    def retr_bytes(self,remote,decompress=None):
+        """ retrieves remote file into memory and returns it as BytesIO
+            The size is checked and failed downloads are retried like save_file
+            decompress: None, 'gzip' or 'bz2'; see save_file
+        """
+
+        size = self.remote_size(remote)
+
+        def retr():
+            buffer = BytesIO()
+            nbytes = [0]
+            def write(block):
+                nbytes[0] += len(block)
+                stream.write(block)
+
+            stream = stream_decompressor(buffer.write,decompress)
+            self.ftp.retrbinary('RETR {}'.format(remote),write,blocksize=self.blocksize)
+            stream.close()
+
+            if(size is not None and nbytes[0] != size):
+                raise ValueError(f'{remote}: {nbytes[0]} of {size} bytes received')
+
+            buffer.seek(0)
+            return buffer
+
+        return self.retry_ftp(retr)
 
     def close_ftp(self):
         """ Close existing ftp connection """
-        self.ftp.close()
\ No newline at end of file
+        self.ftp.close()
+
+def mtime_to_timestamp(mtime):
+    """ Modification time YYYYMMDDHHMMSS (UTC) as POSIX timestamp, None if it can not be parsed """
+
+    try:
+        return calendar.timegm(time.strptime(mtime[:14],'%Y%m%d%H%M%S'))
+    except (TypeError, ValueError):
+        return None
+
+def read_part_meta(meta):
+    """ Returns remote modification time which is kept next to a partial download, None if there is none """
+
+    try:
+        with open(meta) as fil_meta:
+            return fil_meta.read()
+    except OSError:
+        return None
+
+def set_local_mtime(local,timestamp):
+    """ Sets modification time of local file, so later downloads can be compared with the server """
+
+    if(timestamp is not None):
+        os.utime(local,(timestamp, timestamp))
+
+class stream_decompressor():
+    def __init__(self,write,compression=None):
+        """ Decompresses the blocks of a download and passes the result to write
+            write:       function which gets the decompressed blocks
+            compression: None (blocks are passed as they are), 'gzip' or 'bz2'
+        """
+
+        if(compression not in [None, 'gzip', 'bz2']):
+            raise ValueError(f'{compression} compression is not supported')
+
+        self.fwrite      = write
+        self.compression = compression
+        self.dobj        = self.create_decompressobj()
+
+    def create_decompressobj(self):
+        """ Returns new decompressor """
+
+        if(self.compression == 'gzip'):
+            return zlib.decompressobj(16+zlib.MAX_WBITS) # gzip header and trailer
+        elif(self.compression == 'bz2'):
+            return bz2.BZ2Decompressor()
+        else:
+            return None
+
+    def write(self,block):
+        """ Decompresses block, files with several streams (members) are decompressed completely """
+
+        if(self.dobj is None):
+            self.fwrite(block)
+            return
+
+        while(len(block) > 0):
+            if(self.dobj.eof):
+                self.dobj = self.create_decompressobj()
+
+            data = self.dobj.decompress(block)
+            if(len(data) > 0):
+                self.fwrite(data)
+
+            block = self.dobj.unused_data
+
+    def close(self):
+        """ Checks that compressed stream is complete """
+
+        if(self.dobj is None):
+            return
+
+        if(hasattr(self.dobj,'flush')): # only zlib
+            data = self.dobj.flush()
+            if(len(data) > 0):
+                self.fwrite(data)
+
+        if(not self.dobj.eof):
+            raise ValueError('Compressed file ended before the end of stream')
+
+class ftp_pool():
+    def __init__(self,
+                 max_size=FTPPOOLSIZE,
+                 max_idle=FTPMAXIDLE,
+                 keepalive=FTPKEEPALIVE,
+                 timeout=FTPTIMEOUT,
+                 retries=FTPRETRIES,
+                 blocksize=FTPBLOCKSIZE,
+                 factory=None):
+        """ Process wide pool of logged in ftp connections
+            Connections are kept per server and user and can be borrowed
+            by acquire and given back by release
+            max_size:  maximum number of connections per server and user, default FTPPOOLSIZE
+            max_idle:  seconds a connection may be unused before it is closed, default FTPMAXIDLE
+            keepalive: seconds after which an idle connection is checked with NOOP before it is handed out, default FTPKEEPALIVE
+            timeout:   timeout of new connections, default FTPTIMEOUT
+            retries:   retries of failed downloads of new connections, default FTPRETRIES
+            blocksize: block size of downloads of new connections, default FTPBLOCKSIZE
+            factory:   class of connections with the interface of cftp (e.g. chttps), default None --> cftp
+        """
+
+        self.max_size  = max_size
+        self.max_idle  = max_idle
+        self.keepalive = keepalive
+        self.timeout   = timeout
+        self.retries   = retries
+        self.blocksize = blocksize
+        self.factory   = factory
+
+        self.idle  = {} # (url, user) --> list of [cftp, time of last use]
+        self.nused = {} # (url, user) --> number of borrowed connections
+        self.cond  = threading.Condition()
+
+    def acquire(self,url,user=None,passw=None):
+        """ Borrow a logged in connection to url, blocks if max_size connections are in use
+            Give it back with release
+        """
+
+        self.evict_idle()
+
+        if(user is None):
+            key = (url, 'anonymous')
+        else:
+            key = (url, user)
+
+        with self.cond:
+            while(True):
+                idle = self.idle.setdefault(key, [])
+                if(len(idle) > 0):
+                    con, tlast = idle.pop()
+                    break
+                if(self.nused.get(key, 0) < self.max_size):
+                    con, tlast = None, None
+                    break
+                self.cond.wait()
+            self.nused[key] = self.nused.get(key, 0) + 1
+
+        # network traffic outside of the lock
+        try:
+            if(con is None):
+                if(self.factory is None):
+                    factory = cftp
+                else:
+                    factory = self.factory
+                con = factory(url,user,passw,timeout=self.timeout,
+                              retries=self.retries,blocksize=self.blocksize)
+                con.open_ftp()
+            elif(time.time() - tlast > self.keepalive):
+                if(not con.noop_ftp()):
+                    con.reconnect_ftp()
+        except Exception:
+            with self.cond:
+                self.nused[key] -= 1
+                self.cond.notify()
+            raise
+
+        return con
+
+    def release(self,con,broken=False):
+        """ Give borrowed connection back to pool
+            broken: True if connection should not be reused, it is closed then
+        """
+
+        key = (con.url, con.user)
+
+        with self.cond:
+            self.nused[key] -= 1
+            if(not broken):
+                self.idle.setdefault(key, []).append([con, time.time()])
+            self.cond.notify()
+
+        if(broken):
+            close_quietly(con)
+
+        self.evict_idle()
+
+    def evict_idle(self):
+        """ Closes all connections which were not used for max_idle seconds """
+
+        tnow = time.time()
+        expired = []
+
+        with self.cond:
+            for key, idle in self.idle.items():
+                expired += [con for con, tlast in idle if tnow - tlast > self.max_idle]
+                idle[:] = [[con, tlast] for con, tlast in idle if tnow - tlast <= self.max_idle]
+
+        for con in expired:
+            close_quietly(con)
+
+    def close_all(self):
+        """ Closes all idle connections """
+
+        with self.cond:
+            expired = [con for idle in self.idle.values() for con, tlast in idle]
+            self.idle = {}
+
+        for con in expired:
+            close_quietly(con)
+
+def close_quietly(con):
+    """ Closes ftp connection, errors are ignored """
+
+    try:
+        con.ftp.quit()
+    except Exception:
+        try:
+            con.close_ftp()
+        except Exception:
+            pass
+
+# process wide pool, used by all dow_handler instances
+FTP_POOL = ftp_pool()
+atexit.register(FTP_POOL.close_all)
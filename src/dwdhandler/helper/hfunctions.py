@@ -6,7 +6,7 @@ Created on Sat Jun 06 17:32:40 2021
 @email: tobias.schad@googlemail.com
 @description: some helper functions """
 
-from os import makedirs, system, popen, getcwd, listdir, chdir
+from os import makedirs, getcwd, listdir, chdir, replace
 from os.path import exists, isfile, join, split
 import glob
 from sys import stdout, exc_info
@@ -14,17 +14,35 @@ import pandas as pd
 import numpy as np
 import datetime
 import zipfile
+import pickle
 import sqlite3
+import weakref
+import asyncio
+import functools
+from io import StringIO
 import sqlalchemy as sa
 from dotenv import dotenv_values
 from ..helper.postgres import PostgresHandler
+from ..helper.parquet import ParquetHandler, lpyarrow
 from ..constants.constpar import (STATION_VAR_DICT, STATION_INT_VARS, 
                                   STATION_BIGINT_VARS,
                                   STATION_TEXT_VARS, STATION_PRIMARY_KEYS,
                                   STATION_NOT_NULL, STATION_DATE_END_VARS,
                                   REGAVG_PRIMARY_KEYS,
-                                  DATENAMESTAT,DATENAMESTATEND,
-                                  ALLOWED_DRIVERS, POSTGRES_DRIVER, SQLITE_DRIVER)
+                                  DATENAMESTAT,DATENAMESTATEND,STATIONNAMEID,
+                                  STATION_DATE_FORMAT,
+                                  ALLOWED_DRIVERS, POSTGRES_DRIVER, SQLITE_DRIVER, PARQUET_DRIVER,
+                                  SQLITE_PRAGMAS, SQLITE_BULK_PRAGMAS, SQLITE_ROW_CHUNK,
+                                  POSTGRES_INT_VARS, TEXT_ENCODINGS)
+from ..constants.filedata import SYNCMANIFESTTAB, PARQUET_FOLDER
+
+def run_in_thread(func,*args,**kwargs):
+    """ Runs func in a thread of the default executor of the running event loop and returns awaitable
+        (like asyncio.to_thread, which is only available from python 3.9)
+    """
+
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(None,functools.partial(func,*args,**kwargs))
 
 def check_create_dir(dir_in):
     """ Simple check if dir exists, if not create it """
@@ -33,15 +51,21 @@ def check_create_dir(dir_in):
         makedirs(dir_in)
 
 def read_station_list(dir_in,file_in,debug=False):
-    """ Reads DWD station list metadata """
+    """ Reads DWD station list metadata
+        The file is decoded in memory (see decode_text), it is not changed on disk
+    """
 
     if(debug):
         print("Open file {} and read station list".format(dir_in+file_in))
 
-    check_file_encoding(dir_in,file_in)
+    with open(dir_in+file_in,'rb') as fil:
+        text, encoding = decode_text(fil.read())
+
+    if(debug):
+        print("Encoding of {} is {}".format(file_in,encoding))
 
     # First Line and Line with ------ ----- are skipped
-    df_out = pd.read_fwf(dir_in+file_in,skiprows=[0,1],
+    df_out = pd.read_fwf(StringIO(text),skiprows=[0,1],
                           names=['Stations_id', 'von', 'bis', 'hoehe','lat','lon','name','bundesland','abgabe']) 
     df_out['Stations_id'] = df_out['Stations_id'].apply(lambda x: '{0:0>5}'.format(x))
     df_out['von'] = pd.to_datetime(df_out['von'],format="%Y%m%d")
@@ -54,6 +78,34 @@ def read_station_list(dir_in,file_in,debug=False):
 
     return df_out
 
+def load_station_list(fil_cache,mtime):
+    """ Returns station list of cache file (see save_station_list),
+        None if there is no cache file, it is broken or it belongs to another modification time
+    """
+
+    try:
+        with open(fil_cache,'rb') as fil:
+            content = pickle.load(fil)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+
+    if(not isinstance(content, dict) or content.get('mtime') != mtime):
+        return None
+
+    return content.get('station_list')
+
+def save_station_list(fil_cache,mtime,df_station_list):
+    """ Saves parsed station list with modification time of remote file in binary cache file,
+        a temporary file is renamed so readers never see half a file
+    """
+
+    try:
+        with open(fil_cache+'.tmp','wb') as fil:
+            pickle.dump({'mtime':mtime, 'station_list':df_station_list}, fil, protocol=pickle.HIGHEST_PROTOCOL)
+        replace(fil_cache+'.tmp', fil_cache)
+    except OSError as e:
+        print(f"Station list could not be cached: {e}")
+
 def extract_yyyymmdd(date,sep=''):                                                                                                                                                                                                           
     """ extracts hour day month year from string of yyyymmddhh or with seperator                                      
     and returns it as string. 
@@ -91,8 +143,44 @@ def extract_yyyymmddhh(date,sep='',l_minutes=False):
     else:
         return year, month, day, hour
 
+def int_to_datetime(values,resolution):
+    """ converts integer dates of station data (e.g. 2024013123 for hourly data) to datetime
+    with integer arithmetic, which is much faster than parsing strings with pd.to_datetime
+        values:     integer array with dates in format of STATION_DATE_FORMAT
+        resolution: resolution of data (10_minutes, hourly, daily, monthly, yearly)
+    returns DatetimeIndex
+    """
+
+    values = np.asarray(values,dtype=np.int64)
+
+    # two digit fields after the year from the right: e.g. ['m','d','H','M'] for %Y%m%d%H%M
+    fields = {'m':np.ones_like(values), 'd':np.ones_like(values),
+              'H':np.zeros_like(values), 'M':np.zeros_like(values)}
+    for field in reversed(STATION_DATE_FORMAT[resolution].split('%')[2:]):
+        fields[field] = values % 100
+        values = values // 100
+
+    dates   = (values - 1970).astype('datetime64[Y]').astype('datetime64[M]') + (fields['m'] - 1).astype('timedelta64[M]')
+    minutes = (fields['d'] - 1) * 1440 + fields['H'] * 60 + fields['M']
+    dates   = dates.astype('datetime64[m]') + minutes.astype('timedelta64[m]')
+
+    return pd.DatetimeIndex(dates.astype('datetime64[ns]'))
+
+def decode_text(content,encodings=TEXT_ENCODINGS):
+    """ Decodes bytes with the first of encodings which works
+        returns text and encoding
+    """
+
+    for encoding in encodings:
+        try:
+            return content.decode(encoding), encoding
+        except UnicodeDecodeError:
+            pass
+
+    raise UnicodeDecodeError(encodings[-1], content, 0, len(content), "no encoding of {} fits".format(encodings))
+
 def check_file_encoding(dir_in,fil_in,return_enc=False,debug=False):
-    """ Checks file encoding and change it """
+    """ Checks file encoding and change it to utf-8 """
 
     if(debug):
         print("Check File Encoding")
@@ -100,19 +188,14 @@ def check_file_encoding(dir_in,fil_in,return_enc=False,debug=False):
         print(fil_in)
 
     fil_open = dir_in+fil_in
-    f = popen('file -i {}'.format(fil_open))
-    output = f.read()
-    #print(output)
-    #f_index = encoding.index('charset')
-    s_index = output.index('=') # find encoding
-    encoding = output[s_index+1:].strip()
-    encoding.replace(" ","")
-
-    if(not return_enc):
+    with open(fil_open,'rb') as fil:
+        text, encoding = decode_text(fil.read())
+
+    if(not return_enc and encoding not in ['utf-8','utf-8-sig']):
         fil_temp = dir_in+'tmp'
-        system('iconv -f {} -t utf-8 {} > {}'.format(encoding,fil_open,fil_temp))
-        system('mv {} {}'.format(fil_temp,fil_open))
-    #print(encoding)
+        with open(fil_temp,'w',encoding='utf-8') as fil:
+            fil.write(text)
+        replace(fil_temp,fil_open)
 
     if(return_enc):
         return encoding
@@ -165,6 +248,50 @@ def unzip_file(fil_in,dir_in='',dir_to=''):
         zip_ref.extractall(dir_to)
         zip_ref.close()
 
+def read_zip_csv(fil_in,member_start='produkt',ending='.txt',delimiter=';'):
+    """ Reads csv file from zip archive without extracting it
+        fil_in:       zip archive, file name or file like object (e.g. BytesIO)
+        member_start: first member which name starts with member_start is read
+        ending:       ending of member
+        delimiter:    delimiter of csv file
+    """
+
+    with zipfile.ZipFile(fil_in,'r') as zip_ref:
+        for member in zip_ref.namelist():
+            if(split(member)[1].startswith(member_start) and member.endswith(ending)):
+                with zip_ref.open(member) as fil_csv:
+                    return pd.read_csv(fil_csv,delimiter=delimiter)
+
+    raise FileNotFoundError(f"No member {member_start}*{ending} in zip archive")
+
+def parse_ascii_grid(content):
+    """ Parses ESRI ASCII grid (e.g. DWD raster data)
+        The six header lines are parsed once, the body is converted with one numpy call
+        content: content of file as string
+        returns header (dictionary with lower case keys, ncols and nrows as int) and
+                data as 2D numpy array (nrows, ncols) in file order
+    """
+
+    lines = content.split('\n', 6)
+
+    header = {}
+    for line in lines[:6]:
+        name, value = line.split()[:2]
+        header[name.lower()] = float(value)
+
+    header['ncols'] = int(header['ncols'])
+    header['nrows'] = int(header['nrows'])
+
+    body = lines[6]
+
+    # most DWD grids only contain integers, which are parsed much faster
+    if('.' in body or 'e' in body or 'E' in body):
+        data = np.fromstring(body, dtype=np.float64, sep=' ')
+    else:
+        data = np.fromstring(body, dtype=np.int64, sep=' ').astype(np.float64)
+
+    return header, data.reshape(header['nrows'], header['ncols'])
+
 def list_files(dir_in, ending='',only_files=False):
     """ List files in directory 
         ending: if specified only files with this ending are returned
@@ -200,6 +327,8 @@ def open_database(filename=None,
                   config_dir=None,
                   postfile=".env",
                   return_engine=False,
+                  bulk_load=False,
+                  pool_options=None,
                   debug=False):
     """Open Database
     Arguments:
@@ -211,6 +340,10 @@ def open_database(filename=None,
         postgconfig: Configuration Dictionary for postgres 
         config_dir: Directory where config file is stored
         postfile: location of .env File or database.ini File
+        bulk_load: SQLite is tuned for loading much data (no fsync, bigger cache), default False
+                   Only use it if the database can be rebuilt after a crash
+        pool_options: Dictionary with pool_size, max_overflow, pool_pre_ping, pool_recycle
+                   of the PostgreSQL engine, default None --> defaults of PostgresHandler
         debug:    Some additional output
     returns
         con:      Sqlite connection
@@ -224,25 +357,38 @@ def open_database(filename=None,
     if(driver in [SQLITE_DRIVER]):
         con = sqlite3.connect(filename,uri=True)
 
-        con.execute('''PRAGMA synchronous = EXTRA''')
-        con.execute('''PRAGMA journal_mode = WAL''')
+        if(bulk_load):
+            pragmas = SQLITE_BULK_PRAGMAS
+        else:
+            pragmas = SQLITE_PRAGMAS
+
+        for pragma in pragmas:
+            con.execute(pragma)
         con.commit()
     elif(driver in ['PostgreSQL']):
+        if(pool_options is None):
+            pool_options = {}
         if(postgconfig is None):
             if(debug):
                 print("PostgreSQL. Using following configfile: ")
                 print(config_dir, postfile)
             if(config_dir is None):
-                postgres = PostgresHandler(file_location=postfile,dbschema=dbschema)
+                postgres = PostgresHandler(file_location=postfile,dbschema=dbschema,**pool_options)
             else:
-                postgres = PostgresHandler(file_location=config_dir+postfile,dbschema=dbschema)
+                postgres = PostgresHandler(file_location=config_dir+postfile,dbschema=dbschema,**pool_options)
         else:
-            postgres = PostgresHandler(config=postgconfig,dbschema=dbschema)
+            postgres = PostgresHandler(config=postgconfig,dbschema=dbschema,**pool_options)
 
         postgres.connect()
         if(return_engine):
             return postgres.engine
         con = postgres.engine.connect()
+    elif(driver in [PARQUET_DRIVER]):
+        # datasets are stored in PARQUET_FOLDER next to the SQLite file
+        sqlitefile = filename.split('?')[0]
+        if(sqlitefile.startswith('file:')):
+            sqlitefile = sqlitefile[len('file:'):]
+        con = ParquetHandler(join(split(sqlitefile)[0], PARQUET_FOLDER))
     else:
         return {}
 
@@ -264,10 +410,12 @@ def close_database(con,
     if(driver in [SQLITE_DRIVER]):
         con.close()
     elif(driver in ['PostgreSQL']):
-        try:
-            con.dispose()
-        except:
+        # engines are kept in a registry (see postgres.get_engine), closing a
+        # connection returns it to the pool of the engine
+        if(not isinstance(con, sa.engine.Engine)):
             con.close()
+    elif(driver in [PARQUET_DRIVER]):
+        con.close()
 
 def check_drivers(driver):
     """
@@ -280,6 +428,10 @@ def check_drivers(driver):
         print(f"{driver} is not implemented at the moment. Use Following:")
         print(ALLOWED_DRIVERS)
 
+    if(driver in [PARQUET_DRIVER] and not lpyarrow):
+        print("pyarrow is not installed!\nParquet driver will not work")
+        lallowed = False
+
     return lallowed
 
 def create_table_regavg(con,
@@ -341,6 +493,10 @@ def create_table_res(con,
         print("No parameter given, return")
         return False
 
+    if(driver in [PARQUET_DRIVER]):
+        # columns are defined by the written data
+        return True
+
     lwrite_generated = True
 
     if(driver in [POSTGRES_DRIVER]):
@@ -358,30 +514,93 @@ def create_table_res(con,
         con.execute(create_stmt)
     else:
         con.execute(sa.text(create_stmt))
+    create_station_index(con,f'{par}_{resolution}',driver,commit=False)
     con.commit()
     return True
 
+def create_station_index(con,
+                         tabname,
+                         driver=SQLITE_DRIVER,
+                         commit=True):
+    """
+        Create index on station ID and date of station table, if it does not exist yet
+        The primary key does not always start with these columns (e.g. MESS_DATUM_ENDE),
+        so reads of one station in a date range need this index
+    Arguments:
+    ------------------------------------
+        con: connection to database
+        tabname: string --> name of station table
+        driver: string --> driver which is used
+        commit: bool --> commit after creating (default True)
+    """
+
+    if(driver in [PARQUET_DRIVER]):
+        # partitioned by station and sorted by date
+        return
+
+    stmt = f'CREATE INDEX IF NOT EXISTS {tabname}_id_date ON {tabname} ({STATIONNAMEID}, {DATENAMESTAT})'
+
+    if(driver in [SQLITE_DRIVER]):
+        con.execute(stmt)
+    else:
+        con.execute(sa.text(stmt))
+    if(commit):
+        con.commit()
+
+def get_quality_vars(resolution,par,columns=None):
+    """
+        Returns quality variables (QN...) which belong to columns
+        Each quality variable holds for the variables following it in STATION_VAR_DICT
+    Arguments:
+    ------------------------------------
+        resolution: string --> defines resolution (e.g. 10_minutes, hourly, daily...)
+        par: string --> parameter (e.g. air_temperature, precipitation, etc)
+        columns: list of variables, default None --> all quality variables
+    """
+
+    qn_vars = []
+    qn_var  = None
+    for var in STATION_VAR_DICT[resolution][par]:
+        if(var.startswith('QN')):
+            qn_var = var
+            if(columns is None or var in columns):
+                qn_vars.append(var)
+        elif(columns is not None and var in columns and qn_var is not None and qn_var not in qn_vars):
+            qn_vars.append(qn_var)
+
+    return qn_vars
+
 def create_table_res_climstats(con,
                                resolution,
                                par,
                                tablename,
                                ctype=None,
                                driver=SQLITE_DRIVER,
+                               commit=True,
                                debug=False):
     """
         Create table of climstats according given resolution and parameter
     Arguments:
         con: connection to database
         tablename: str --> tablename to be created
+        commit: bool --> commit after creating, set False to create it inside a running transaction
         debug: bool --> some extra output for debugging
     """
 
+    if(driver in [PARQUET_DRIVER]):
+        # columns are defined by the written data
+        return
+
     create_stmt = create_statement(resolution=resolution,par=par,
                                    tabname=tablename,lclimstat=True,ctype=ctype,driver=driver)
     print(tablename)
     print(create_stmt)
-    con.execute(create_stmt)
-    con.commit()
+    if(driver in [SQLITE_DRIVER]):
+        con.execute(create_stmt)
+    else:
+        con.execute(sa.text(create_stmt))
+    if(commit):
+        con.commit()
 
 def drop_table(tabname=None,
                filename=None,
@@ -447,7 +666,206 @@ def delete_sqlite_where(tabname=None,
 
     con.close()
 
+def create_table_manifest(con,
+                          driver=SQLITE_DRIVER):
+    """
+        Create table which keeps the state of synchronised archives (SYNCMANIFESTTAB)
+    Arguments:
+        con: connection to database
+        driver: string --> driver which is used
+    """
+
+    if(driver in [PARQUET_DRIVER]):
+        return
+
+    create_stmt = f"CREATE TABLE IF NOT EXISTS {SYNCMANIFESTTAB} ("\
+                   "pathremote TEXT NOT NULL, "\
+                   "filename TEXT NOT NULL, "\
+                   "size BIGINT, "\
+                   "mtime TEXT, "\
+                   "checksum TEXT, "\
+                   "ingest_time TEXT, "\
+                   "PRIMARY KEY(pathremote, filename))"
+
+    if(driver in [SQLITE_DRIVER]):
+        con.execute(create_stmt)
+    else:
+        con.execute(sa.text(create_stmt))
+    con.commit()
+
+def read_manifest(con,
+                  pathremote,
+                  driver=SQLITE_DRIVER):
+    """
+        Reads state of synchronised archives of one remote directory
+    Arguments:
+        con: connection to database
+        pathremote: string --> remote directory
+        driver: string --> driver which is used
+    returns
+        dictionary file name --> (size, modification time)
+    """
+
+    if(driver in [PARQUET_DRIVER]):
+        df_manifest = con.read_table(SYNCMANIFESTTAB, columns=['filename','size','mtime'],
+                                     filters=[('pathremote', '=', pathremote)])
+    else:
+        # pathremote is bound as parameter, not put into the statement
+        if(driver in [POSTGRES_DRIVER]):
+            sqlexec = sa.text(f"SELECT filename, size, mtime FROM {SYNCMANIFESTTAB} WHERE pathremote = :pathremote")
+            params  = {'pathremote':pathremote}
+        else:
+            sqlexec = f"SELECT filename, size, mtime FROM {SYNCMANIFESTTAB} WHERE pathremote = ?"
+            params  = (pathremote,)
+
+        df_manifest = pd.read_sql_query(sqlexec, con, params=params)
+
+    return {row.filename: (int(row.size), row.mtime) for row in df_manifest.itertuples()}
+
+def write_manifest(con,
+                   pathremote,
+                   filename,
+                   size,
+                   mtime,
+                   checksum,
+                   driver=SQLITE_DRIVER,
+                   commit=True):
+    """
+        Writes state of one synchronised archive, existing entries are replaced
+    Arguments:
+        con: connection to database
+        pathremote: string --> remote directory
+        filename: string --> name of archive
+        size: int --> size of archive in bytes
+        mtime: string --> modification time on server
+        checksum: string --> md5 checksum of archive
+        driver: string --> driver which is used
+        commit: commit after writing (default True)
+    """
+
+    write_manifests(con, pathremote, [(filename, size, mtime, checksum)], driver, commit=commit)
+
+def write_manifests(con,
+                    pathremote,
+                    entries,
+                    driver=SQLITE_DRIVER,
+                    commit=True):
+    """
+        Writes state of many synchronised archives at once, existing entries are replaced
+    Arguments:
+        con: connection to database
+        pathremote: string --> remote directory
+        entries: list of tuples (filename, size, mtime, checksum), see write_manifest
+        driver: string --> driver which is used
+        commit: commit after writing (default True)
+    """
+
+    if(len(entries) == 0):
+        return
+
+    filenames, sizes, mtimes, checksums = zip(*entries)
+    df_manifest = pd.DataFrame({'pathremote':[pathremote]*len(entries),
+                                'filename':list(filenames),
+                                'size':list(sizes),
+                                'mtime':list(mtimes),
+                                'checksum':list(checksums),
+                                'ingest_time':[datetime.datetime.now().strftime('%Y%m%d%H%M%S')]*len(entries)})
+
+    write_sqlite_data(df_manifest, con, SYNCMANIFESTTAB, driver, commit=commit)
+
+def iter_rows(data,chunksize=SQLITE_ROW_CHUNK):
+    """
+        Generator over rows of DataFrame as tuples of python types
+        Columns are converted chunkwise from their numpy arrays, so no list of lists of the
+        whole DataFrame is created
+    Arguments:
+        data: dataframe
+        chunksize: number of rows converted at once
+    """
+
+    arrays = [data[col].to_numpy() for col in data]
+
+    for istart in range(0, len(data), chunksize):
+        yield from zip(*[arr[istart:istart+chunksize].tolist() for arr in arrays])
+
+# primary keys of postgres tables, per engine and table
+PG_PK_CACHE = weakref.WeakKeyDictionary()
+
+def get_primary_keys(con, table):
+    """
+        Returns primary key columns of postgres table
+        The lookup is only done once per engine and table
+    Arguments:
+        con: Connection
+        table: tablename
+    """
+
+    tables = PG_PK_CACHE.setdefault(con.engine, {})
+
+    if(table not in tables):
+        inspector = sa.Inspector(con)
+        tables[table] = inspector.get_pk_constraint(table_name=table)['constrained_columns']
+
+    return tables[table]
+
+def write_postgres_copy(data, con, table,
+                        debug=False):
+    """
+        Write data to postgres with COPY
+        Data is streamed as csv into a temporary staging table (not WAL logged) and then
+        merged into table with one INSERT ... SELECT ... ON CONFLICT DO UPDATE
+        Rows with the same primary key are written once (the last one wins, like writing row by row)
+        Nothing is committed
+    Arguments:
+        data: dataframe
+        con:  Connection (sqlalchemy with psycopg2)
+        table: tablename
+    """
+
+    stage = f"{table}_staging"
+    cols  = ", ".join(data.columns)
+
+    pk_keys = get_primary_keys(con, table)
+
+    # ON CONFLICT DO UPDATE can not change a row twice in one statement
+    # postgres returns lower case names of primary keys
+    columns_lower = {col.lower():col for col in data.columns}
+    pk_cols = [columns_lower.get(key.lower()) for key in pk_keys]
+    if(len(pk_cols) > 0 and None not in pk_cols):
+        data = data.drop_duplicates(subset=pk_cols, keep='last')
+
+    # float columns which are integer in database (e.g. because of NaN) would be written as 1.0
+    data_copy = data.copy(deep=False)
+    for col in data_copy:
+        if(col in POSTGRES_INT_VARS and data_copy[col].dtype.kind == 'f'):
+            data_copy[col] = data_copy[col].round().astype('Int64')
+
+    buffer = StringIO()
+    data_copy.to_csv(buffer, index=False, header=False, na_rep='')
+    buffer.seek(0)
+
+    # executed by sqlalchemy, so the transaction is known by con
+    con.execute(sa.text(f"CREATE TEMP TABLE IF NOT EXISTS {stage} (LIKE {table} INCLUDING DEFAULTS)"))
+    # staging table lives as long as the connection, which is reused by the pool
+    con.execute(sa.text(f"TRUNCATE {stage}"))
+
+    if(debug):
+        print(f"COPY {len(data)} rows to {stage}")
+
+    cur = con.connection.cursor()
+    cur.copy_expert(f"COPY {stage} ({cols}) FROM STDIN WITH (FORMAT csv)", buffer)
+    cur.close()
+
+    merge_stmt  = f"INSERT INTO {table} ({cols}) SELECT {cols} FROM {stage} "
+    merge_stmt += f"ON CONFLICT ({', '.join(pk_keys)}) DO UPDATE SET "
+    merge_stmt += ", ".join([f"{col} = EXCLUDED.{col}" for col in data])
+
+    con.execute(sa.text(merge_stmt))
+    con.execute(sa.text(f"TRUNCATE {stage}"))
+
 def write_sqlite_data(data,con, table, driver,
+                      commit=True,
+                      use_copy=True,
                       debug=False):
     """
         Write data to sqlite
@@ -456,11 +874,25 @@ def write_sqlite_data(data,con, table, driver,
         con:  Connection
         driver: to use
         table: tablename
+        commit: commit after writing, set False to write many DataFrames in one transaction (default True)
+        use_copy: PostgreSQL only, write with COPY and a staging table instead of INSERT (default True)
     """
 
     if(debug):
         print("Write data direct")
 
+    if(driver in [POSTGRES_DRIVER] and use_copy and len(data) > 0):
+        write_postgres_copy(data, con, table, debug=debug)
+        if(commit):
+            con.commit()
+        return
+
+    if(driver in [PARQUET_DRIVER]):
+        con.write(data, table)
+        if(commit):
+            con.commit()
+        return
+
     if(driver in [SQLITE_DRIVER]):
         cur = con.cursor()
 
@@ -486,9 +918,8 @@ def write_sqlite_data(data,con, table, driver,
 
     if(driver in [POSTGRES_DRIVER]):
         insert_stmt = insert_stmt[:-1]
-        inspector = sa.Inspector(con)
-        pk_keys = inspector.get_pk_constraint(table_name=table)['constrained_columns']
-        insert_stmt += f" ON CONFLICT {tuple(pk_keys)} ".replace('\'','')
+        pk_keys = get_primary_keys(con, table)
+        insert_stmt += f" ON CONFLICT ({', '.join(pk_keys)}) "
         insert_stmt += f" DO UPDATE SET "
         for col in data:
             insert_stmt += f"{col} = EXCLUDED.{col}, "
@@ -496,10 +927,11 @@ def write_sqlite_data(data,con, table, driver,
         insert_stmt += ";"
 
     if(driver in ['SQLite']):
-        cur.executemany(insert_stmt,data.values.tolist())
-        con.commit()
+        cur.executemany(insert_stmt,iter_rows(data))
     else:
         con.execute(sa.text(insert_stmt), data.to_dict(orient='records'))
+
+    if(commit):
         con.commit()
             
 
@@ -777,10 +1209,29 @@ def check_for_table(con,table, driver):
             return False
         else:
             return True
+    elif(driver in [PARQUET_DRIVER]):
+        return con.has_table(table)
     else:
         inspector = sa.Inspector(con)
         return table in inspector.get_table_names()
 
+def get_table_names(con, driver):
+    """
+        Returns set with names of all tables of connection
+    Arguments:
+        con: Connection
+        driver: string --> driver which is used
+    """
+
+    if(driver in ['SQLite']):
+        cur = con.cursor()
+        return set(name for (name,) in cur.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall())
+    elif(driver in [PARQUET_DRIVER]):
+        return con.table_names()
+    else:
+        inspector = sa.Inspector(con)
+        return set(inspector.get_table_names())
+
 def write_exc_info():
     exc_type, exc_obj, exc_tb = exc_info()
     fname = split(exc_tb.tb_frame.f_code.co_filename)[1]
@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 20:30:00 2026
+
+@author: Tobias Schad
+@email: tobias.schad@googlemail.com
+@description: HTTPS access to opendata.dwd.de with the same interface as cftp """
+
+import os
+import re
+import atexit
+import time
+import datetime
+import threading
+import posixpath
+import email.utils
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+
+# try to import requests
+try:
+    import requests
+    lrequests = True
+except:
+    lrequests = False
+
+from ..constants.serverdata import (FTPTIMEOUT, FTPRETRIES, FTPBACKOFF, FTPBLOCKSIZE,
+                                    HTTPSBASEURL, HTTPSRANGEPARTS, HTTPSRANGEMIN)
+from .ftp import ftp_pool, stream_decompressor, read_part_meta
+
+# entry of directory listing (nginx/apache autoindex): link, date and size
+LISTINGENTRY = re.compile(r'<a href="([^"?/][^"]*)">[^<]*</a>\s+(\d{2}-\w{3}-\d{4} \d{2}:\d{2}(?::\d{2})?)\s+(\d+|-)')
+# plain link of directory listing without date and size (e.g. python http.server)
+LISTINGLINK = re.compile(r'<a href="([^"?/#][^"]*)"')
+
+class http_error_perm(Exception):
+    """ Permanent error (4xx, e.g. file not found), the request is not repeated """
+    pass
+
+class chttps():
+    def __init__(self,url,user=None,passw=None,timeout=FTPTIMEOUT,
+                 retries=FTPRETRIES,backoff=FTPBACKOFF,blocksize=FTPBLOCKSIZE):
+        """ Class to handle HTTPS access to a server, it can be used instead of cftp
+            The session keeps connections alive, listings are cached with ETag/Last-Modified,
+            interrupted downloads are continued with range requests and big files are
+            downloaded with several range requests at once.
+            url: server name, the base url is taken from HTTPSBASEURL (default https://<url>/)
+            user: If user credential is needed, default None
+            passw: if password credential is needed, default None
+            timeout, retries, backoff, blocksize: see cftp
+        """
+
+        self.url   = url
+        if(user is None):
+            self.user = 'anonymous'
+        else:
+            self.user  = user
+        self.passw = passw
+
+        self.base_url  = HTTPSBASEURL.get(url, f'https://{url}/')
+        self.timeout   = timeout
+        self.retries   = retries
+        self.backoff   = backoff
+        self.blocksize = blocksize
+        self.home      = '/'
+        self.location  = '/'
+        self.listings  = {} # url --> (ETag, Last-Modified, files)
+        self.session   = None
+
+    def open_ftp(self):
+        """ Opens session, connections are opened by the first request and kept alive """
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1,pool_maxsize=HTTPSRANGEPARTS)
+        self.session.mount('http://',adapter)
+        self.session.mount('https://',adapter)
+        if(self.user != 'anonymous'):
+            self.session.auth = (self.user, self.passw)
+        # files are needed as they are on the server (e.g. .gz)
+        self.session.headers['Accept-Encoding'] = 'identity'
+
+    def reconnect_ftp(self):
+        """ Closes session and opens it again """
+
+        self.close_ftp()
+        self.open_ftp()
+
+    def noop_ftp(self):
+        """ HTTP has no connection state, a dropped connection is opened again by the session """
+        return self.session is not None
+
+    def cwd_ftp(self,location):
+        """ Change location, relative locations are relative to the base url """
+
+        if(not location.startswith('/')):
+            location = posixpath.join(self.home,location)
+
+        if(not location.endswith('/')):
+            location = location + '/'
+
+        self.location = location
+
+    def remote_url(self,remote=''):
+        """ Url of remote file in current location """
+        return self.base_url.rstrip('/') + posixpath.join(self.location,remote)
+
+    def request(self,method,url,**kwargs):
+        """ Sends request, 4xx except 416 raise http_error_perm """
+
+        response = self.session.request(method,url,timeout=self.timeout,**kwargs)
+        if(400 <= response.status_code < 500 and response.status_code != 416):
+            response.close()
+            raise http_error_perm(f'{response.status_code} {url}')
+        return response
+
+    def retry_http(self,func):
+        """ Calls func until it succeeds, at most retries+1 times (see cftp.retry_ftp) """
+
+        for iretry in range(self.retries+1):
+            try:
+                return func()
+            except http_error_perm:
+                raise
+            except (requests.RequestException, OSError, ValueError) as Excp:
+                if(iretry == self.retries):
+                    raise
+                print(f"Download failed ({Excp}), retry {iretry+1} of {self.retries}")
+
+            time.sleep(self.backoff*2**iretry)
+
+    def retr_files_ftp(self):
+        """ retrieves files from current location """
+        return list(self.retr_files_facts_ftp())
+
+    def retr_files_facts_ftp(self,ending=None):
+        """ retrieves files of current location with size and modification time from the
+            directory listing; the listing is only transferred again if it changed (ETag, Last-Modified)
+            ending: if specified only files with this ending are returned
+            returns dictionary file name --> (size, modification time as YYYYMMDDHHMMSS)
+        """
+
+        url = self.remote_url()
+
+        def retr():
+            headers = {}
+            if(url in self.listings):
+                etag, modified, files = self.listings[url]
+                if(etag is not None):
+                    headers['If-None-Match'] = etag
+                if(modified is not None):
+                    headers['If-Modified-Since'] = modified
+
+            response = self.request('GET',url,headers=headers)
+            if(response.status_code == 304):
+                return self.listings[url][2]
+            response.raise_for_status()
+
+            entries = LISTINGENTRY.findall(response.text)
+            if(entries):
+                files = {}
+                for name, date, size in entries:
+                    if(size == '-'): # directory
+                        continue
+                    name = requests.utils.unquote(name)
+                    files[name] = (int(size), parse_listing_date(date))
+            else:
+                files = self.parse_listing_links(url,response.text)
+
+            self.listings[url] = (response.headers.get('ETag'), response.headers.get('Last-Modified'), files)
+            return files
+
+        files = self.retry_http(retr)
+
+        if(ending is None):
+            return dict(files)
+        else:
+            return {name: facts for name, facts in files.items() if name.endswith(ending)}
+
+    def parse_listing_links(self,url,text):
+        """ Files of directory listing with links only, size and modification time are taken from HEAD
+            raises http_error_perm if the page is not empty but has no links (not a directory listing)
+        """
+
+        links = [requests.utils.unquote(link) for link in LISTINGLINK.findall(text) if '://' not in link]
+        if(not links and text.strip()):
+            raise http_error_perm(f'{url} is no directory listing')
+
+        files = {}
+        for name in links:
+            if(name.endswith('/') or '/' in name): # directories and parent directory
+                continue
+            try:
+                head = self.remote_head(name)
+            except http_error_perm: # dead link
+                continue
+            size, modified, etag, lranges = head
+            files[name] = (-1 if size is None else size, parse_http_date(modified))
+
+        return files
+
+    def remote_head(self,remote,local=None):
+        """ Returns size, Last-Modified, ETag and True if ranges are supported,
+            returns None if local exists and the remote file is not newer (If-Modified-Since)
+        """
+
+        headers = {}
+        if(local is not None and os.path.isfile(local)):
+            headers['If-Modified-Since'] = email.utils.formatdate(os.path.getmtime(local),usegmt=True)
+
+        response = self.request('HEAD',self.remote_url(remote),headers=headers,allow_redirects=True)
+        if(response.status_code == 304):
+            return None
+        response.raise_for_status()
+
+        size = response.headers.get('Content-Length')
+        if(size is not None):
+            size = int(size)
+
+        return (size, response.headers.get('Last-Modified'), response.headers.get('ETag'),
+                response.headers.get('Accept-Ranges') == 'bytes')
+
+    def save_file(self,remote,local,decompress=None,if_modified=False):
+        """ retrieves remote file and saves it to local, like cftp.save_file
+            local gets the modification time of the remote file (Last-Modified).
+            The file is written to local.part and renamed when it is complete, an interrupted
+            download is continued with a range request. The version of the remote file (ETag or
+            Last-Modified) is kept in local.part.meta and sent as If-Range, so a changed file
+            is downloaded again from the beginning. Files bigger than HTTPSRANGEMIN are
+            downloaded with HTTPSRANGEPARTS range requests at once.
+            decompress: None, 'gzip' or 'bz2'; see cftp.save_file
+            if_modified: only download if local does not exist or the remote file is newer
+                         (If-Modified-Since), default False
+        """
+
+        head = self.retry_http(lambda: self.remote_head(remote,local if if_modified else None))
+        if(head is None):
+            return
+
+        size, modified, etag, lranges = head
+        partial = local+'.part'
+        meta    = partial+'.meta'
+        version = range_validator(etag,modified)
+
+        # local.part is only continued if it belongs to the same version of the remote file
+        if(os.path.isfile(partial) and (version is None or read_part_meta(meta) != version)):
+            os.remove(partial)
+
+        if(decompress is None and version is not None):
+            with open(meta,'w') as fil_meta:
+                fil_meta.write(version)
+
+        if(decompress is None and lranges and size is not None and size >= HTTPSRANGEMIN):
+            self.retry_http(lambda: self.retr_ranges(remote,partial,size,version))
+        else:
+            def retr():
+                if(decompress is None and lranges and version is not None and os.path.isfile(partial)):
+                    offset = os.path.getsize(partial)
+                else:
+                    offset = 0
+
+                if(size is not None and offset > size): # remote file changed
+                    offset = 0
+
+                headers = {}
+                if(offset > 0):
+                    headers['Range']    = f'bytes={offset}-'
+                    headers['If-Range'] = version # whole file (200) if it changed
+
+                nbytes = offset
+                response = self.request('GET',self.remote_url(remote),headers=headers,stream=True)
+                with response:
+                    if(response.status_code == 416): # nothing left to download
+                        nbytes = offset
+                    else:
+                        response.raise_for_status()
+                        if(offset > 0 and response.status_code != 206): # changed or range not supported
+                            offset = nbytes = 0
+
+                        with open(partial,'ab' if offset > 0 else 'wb') as fil_save:
+                            stream = stream_decompressor(fil_save.write,decompress)
+                            for block in response.iter_content(chunk_size=self.blocksize):
+                                nbytes += len(block)
+                                stream.write(block)
+                            stream.close()
+
+                if(size is not None and nbytes != size):
+                    raise ValueError(f'{remote}: {nbytes} of {size} bytes received')
+
+            try:
+                self.retry_http(retr)
+            except:
+                # decompressed data can not be continued
+                if(os.path.isfile(partial) and (decompress is not None or os.path.getsize(partial) == 0)):
+                    os.remove(partial)
+                if(not os.path.isfile(partial) and os.path.isfile(meta)):
+                    os.remove(meta)
+                raise
+
+        os.replace(partial,local)
+        if(os.path.isfile(meta)):
+            os.remove(meta)
+
+        # modification time of server, so the next call can ask If-Modified-Since
+        if(modified is not None):
+            mtime = email.utils.parsedate_to_datetime(modified).timestamp()
+            os.utime(local,(mtime, mtime))
+
+    def retr_ranges(self,remote,partial,size,version=None):
+        """ Downloads file with HTTPSRANGEPARTS range requests at once into partial
+            version: ETag or Last-Modified of remote file, sent as If-Range, so the parts
+                     can not belong to different versions of the file
+        """
+
+        with open(partial,'wb') as fil_save:
+            fil_save.truncate(size)
+
+        nparts = HTTPSRANGEPARTS
+        bounds = [size*ipart//nparts for ipart in range(nparts+1)]
+        lock   = threading.Lock()
+
+        def retr_part(ipart):
+            start, end = bounds[ipart], bounds[ipart+1]-1
+            headers = {'Range':f'bytes={start}-{end}'}
+            if(version is not None):
+                headers['If-Range'] = version
+            response = self.request('GET',self.remote_url(remote),headers=headers,stream=True)
+            with response:
+                if(response.status_code != 206):
+                    raise ValueError(f'{remote}: range request not answered')
+                position = start
+                with open(partial,'r+b') as fil_save:
+                    for block in response.iter_content(chunk_size=self.blocksize):
+                        with lock:
+                            fil_save.seek(position)
+                            fil_save.write(block)
+                        position += len(block)
+            if(position != end+1):
+                raise ValueError(f'{remote}: {position-start} of {end+1-start} bytes of range received')
+
+        with ThreadPoolExecutor(max_workers=nparts) as executor:
+            for future in [executor.submit(retr_part,ipart) for ipart in range(nparts)]:
+                future.result()
+
+    def retr_bytes(self,remote,decompress=None):
+        """ retrieves remote file into memory and returns it as BytesIO, like cftp.retr_bytes """
+
+        def retr():
+            buffer = BytesIO()
+            stream = stream_decompressor(buffer.write,decompress)
+
+            response = self.request('GET',self.remote_url(remote),stream=True)
+            with response:
+                response.raise_for_status()
+                size = response.headers.get('Content-Length')
+                nbytes = 0
+                for block in response.iter_content(chunk_size=self.blocksize):
+                    nbytes += len(block)
+                    stream.write(block)
+            stream.close()
+
+            if(size is not None and nbytes != int(size)):
+                raise ValueError(f'{remote}: {nbytes} of {size} bytes received')
+
+            buffer.seek(0)
+            return buffer
+
+        return self.retry_http(retr)
+
+    def close_ftp(self):
+        """ Close session """
+
+        if(self.session is not None):
+            self.session.close()
+            self.session = None
+
+def range_validator(etag,modified):
+    """ Returns validator of If-Range: strong ETag, otherwise Last-Modified, None if there is none """
+
+    if(etag is not None and not etag.startswith('W/')):
+        return etag
+    return modified
+
+def parse_listing_date(date):
+    """ Date of directory listing (e.g. 15-Mar-2024 10:11) as YYYYMMDDHHMMSS """
+
+    for fmt in ['%d-%b-%Y %H:%M:%S', '%d-%b-%Y %H:%M']:
+        try:
+            return datetime.datetime.strptime(date, fmt).strftime('%Y%m%d%H%M%S')
+        except ValueError:
+            pass
+
+    return ''
+
+def parse_http_date(date):
+    """ Date of HTTP header (e.g. Last-Modified) as YYYYMMDDHHMMSS (UTC) """
+
+    try:
+        return email.utils.parsedate_to_datetime(date).astimezone(datetime.timezone.utc).strftime('%Y%m%d%H%M%S')
+    except (TypeError, ValueError):
+        return ''
+
+# process wide pool of HTTPS sessions
+HTTPS_POOL = ftp_pool(factory=chttps)
+atexit.register(HTTPS_POOL.close_all)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:05:00 2026
+
+@author: Tobias Schad
+@email: tobias.schad@googlemail.com
+@description: Cache of remote directory listings """
+
+import os
+import json
+import time
+
+from ..constants.serverdata import LISTINGTTL
+
+class listing_cache():
+    def __init__(self,cache_dir,ttl=LISTINGTTL):
+        """ Caches listings of remote directories (file name --> size, modification time)
+            Each listing is kept in memory and in a JSON file in cache_dir, so it is also
+            used by later sessions until it is older than ttl seconds.
+            Listings are kept per transport, because the modification times of FTP (MLSD)
+            and HTTPS (directory page) have different precision.
+            cache_dir: local directory of JSON files
+            ttl:       seconds a listing is valid, default LISTINGTTL
+        """
+
+        self.cache_dir = cache_dir
+        self.ttl       = ttl
+        self.listings  = {} # (transport, pathremote) --> (time of listing, files)
+
+    def filename(self,key):
+        """ JSON file of listing of key (transport, pathremote) """
+
+        transport, pathremote = key
+        name = pathremote.strip('/').replace('/','_')
+        if(transport is not None):
+            name = f'{transport}_{name}'
+
+        return os.path.join(self.cache_dir, name+'.json')
+
+    def get(self,pathremote,retrieve,refresh=False,transport=None):
+        """ Returns listing of pathremote, it is retrieved if there is no valid listing in cache
+            retrieve:  function without arguments, which returns dictionary
+                       file name --> (size, modification time) (e.g. cftp.retr_files_facts_ftp)
+            refresh:   retrieve listing in any case, default False
+            transport: transport which retrieves the listing (e.g. 'ftp'), default None
+        """
+
+        key  = (transport, pathremote)
+        tnow = time.time()
+
+        if(not refresh):
+            if(key not in self.listings):
+                self.load(key)
+            if(key in self.listings):
+                tlisting, files = self.listings[key]
+                if(tnow - tlisting <= self.ttl):
+                    return files
+
+        files = retrieve()
+        self.listings[key] = (tnow, files)
+        self.save(key)
+
+        return files
+
+    def load(self,key):
+        """ Loads listing from JSON file, broken files are ignored """
+
+        try:
+            with open(self.filename(key)) as fil:
+                content = json.load(fil)
+            files = {name: tuple(facts) for name, facts in content['files'].items()}
+            self.listings[key] = (content['time'], files)
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def save(self,key):
+        """ Saves listing to JSON file, a temporary file is renamed so readers never see half a file """
+
+        tlisting, files = self.listings[key]
+        filename = self.filename(key)
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(filename+'.tmp','w') as fil:
+                json.dump({'path':key[1], 'transport':key[0], 'time':tlisting, 'files':files}, fil)
+            os.replace(filename+'.tmp', filename)
+        except OSError as e:
+            print(f"Listing could not be cached: {e}")
+
+    def invalidate(self,pathremote=None,transport=None):
+        """ Removes listing of pathremote (default None --> all listings) of transport from cache """
+
+        if(pathremote is None):
+            keys = list(self.listings)
+        else:
+            keys = [(transport, pathremote)]
+
+        for key in keys:
+            self.listings.pop(key, None)
+            if(os.path.isfile(self.filename(key))):
+                os.remove(self.filename(key))
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 14:05:00 2026
+
+@author: Tobias Schad
+@email: tobias.schad@googlemail.com
+@description: Storage of tables as partitioned Parquet datasets
+"""
+
+import os
+import glob
+import pandas as pd
+
+# try to import pyarrow
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    lpyarrow = True
+except:
+    lpyarrow = False
+
+from ..constants.constpar import STATIONNAMEID, POSTGRES_INT_VARS, PARQUET_KEY_VARS
+
+class ParquetHandler():
+    def __init__(self, dataset_dir):
+        """ Handles tables which are stored as Parquet datasets, one directory per table.
+            Tables with STATIONS_ID are partitioned by station (STATIONS_ID=<id>/part-0.parquet).
+            It is used like a database connection: write collects data and commit merges it into
+            the files. Rows with the same key (see PARQUET_KEY_VARS) are replaced like
+            INSERT OR REPLACE of SQLite, so writing the same data again changes nothing.
+            dataset_dir: directory of datasets
+        """
+
+        self.dataset_dir = dataset_dir
+        self.pending     = {} # table --> list of DataFrames, written by commit
+
+    def table_dir(self, table):
+        """ Directory of table """
+        return os.path.join(self.dataset_dir, table)
+
+    def has_table(self, table):
+        """ Returns True if table exists """
+        return os.path.isdir(self.table_dir(table))
+
+    def table_names(self):
+        """ Returns set with names of all tables """
+
+        if(not os.path.isdir(self.dataset_dir)):
+            return set()
+
+        return set(name for name in os.listdir(self.dataset_dir) if self.has_table(name))
+
+    def write(self, data, table):
+        """ Collects data which is written to table by commit """
+
+        if(len(data) > 0):
+            self.pending.setdefault(table, []).append(data)
+
+    def commit(self):
+        """ Merges all collected data into the files of the tables """
+
+        for table, df_arr in self.pending.items():
+            data = pd.concat(df_arr, ignore_index=True)
+            keys = [col for col in data.columns if col in PARQUET_KEY_VARS]
+
+            if(STATIONNAMEID in data.columns):
+                for key, df_station in data.groupby(STATIONNAMEID):
+                    path = os.path.join(self.table_dir(table), f'{STATIONNAMEID}={int(key)}')
+                    self.merge_partition(path, df_station.drop(columns=[STATIONNAMEID]),
+                                         [col for col in keys if col != STATIONNAMEID])
+            else:
+                self.merge_partition(self.table_dir(table), data, keys)
+
+        self.pending = {}
+
+    def rollback(self):
+        """ Discards all collected data """
+        self.pending = {}
+
+    def close(self):
+        """ Data which is not committed is discarded, like closing a database connection """
+        self.rollback()
+
+    def merge_partition(self, path, data, keys):
+        """ Merges data into the file of one partition, existing rows with the same keys are replaced
+            path: directory of partition
+            data: DataFrame without partition column
+            keys: columns which identify a row
+        """
+
+        os.makedirs(path, exist_ok=True)
+        filename = os.path.join(path, 'part-0.parquet')
+
+        if(os.path.isfile(filename)):
+            data = pd.concat([pq.read_table(filename).to_pandas(), data], ignore_index=True)
+
+        data = normalize_types(data)
+        if(len(keys) > 0):
+            data = data.drop_duplicates(subset=keys, keep='last').sort_values(keys)
+
+        # write to temporary file first, so a crash never leaves a broken partition
+        pq.write_table(pa.Table.from_pandas(data, preserve_index=False), filename+'.tmp')
+        os.replace(filename+'.tmp', filename)
+
+    def read_table(self, table, columns=None, filters=None):
+        """ Reads table, only the given columns and rows are read
+            Filters on STATIONS_ID only open the partitions of these stations, other filters
+            are checked against the statistics of the row groups first
+            table:   table name
+            columns: list of columns, default None --> all columns
+            filters: filters in the format of pyarrow.parquet, e.g. [('MESS_DATUM', '>=', 20240101)]
+            returns DataFrame
+        """
+
+        if(not self.has_table(table) or len(glob.glob(os.path.join(self.table_dir(table), '**', '*.parquet'), recursive=True)) == 0):
+            return pd.DataFrame(columns=columns)
+
+        partitioning = ds.partitioning(pa.schema([(STATIONNAMEID, pa.int64())]), flavor='hive')
+        dataset = ds.dataset(self.table_dir(table), format='parquet', partitioning=partitioning,
+                             exclude_invalid_files=True)
+
+        if(columns is None):
+            columns = dataset.schema.names
+            if(STATIONNAMEID in columns):
+                columns = [STATIONNAMEID] + [col for col in columns if col != STATIONNAMEID]
+
+        if(filters is None or len(filters) == 0):
+            expression = None
+        else:
+            expression = pq.filters_to_expression(filters)
+
+        return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+def normalize_types(data):
+    """ Same type of each column in all files: integer columns (also with missing values) are Int64,
+        other numeric columns float64 and all other columns string
+    """
+
+    data = data.copy()
+    for col in data.columns:
+        if(col in POSTGRES_INT_VARS and data[col].dtype.kind in 'iuf'):
+            data[col] = data[col].round().astype('Int64')
+        elif(data[col].dtype.kind in 'iuf'):
+            data[col] = data[col].astype('float64')
+        else:
+            data[col] = data[col].astype('string')
+
+    return data
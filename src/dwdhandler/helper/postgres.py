@@ -11,13 +11,26 @@ Created on Mon Jul 01 16:01:28 2024
 from dotenv import dotenv_values
 from pathlib import Path
 from configparser import ConfigParser
+import threading
 import psycopg2
 from sqlalchemy import create_engine
 
+from ..constants.constpar import (POSTGRES_POOL_SIZE, POSTGRES_MAX_OVERFLOW,
+                                  POSTGRES_PRE_PING, POSTGRES_RECYCLE)
+
 necessary_config_keys = ['host', 'database', 'user', 'password', 'port']
 
+# engines are created once per connection configuration and schema and kept for the
+# whole process, so connections are reused by the pool of the engine
+ENGINES = {}
+ENGINES_LOCK = threading.Lock()
+
 class PostgresHandler():
-    def __init__(self, dbschema, config=None, file_location=".env"):
+    def __init__(self, dbschema, config=None, file_location=".env",
+                 pool_size=POSTGRES_POOL_SIZE,
+                 max_overflow=POSTGRES_MAX_OVERFLOW,
+                 pool_pre_ping=POSTGRES_PRE_PING,
+                 pool_recycle=POSTGRES_RECYCLE):
         """
             Class which handles postgres connection
             config (Dict): Contains essential authorization credentials
@@ -31,9 +44,18 @@ class PostgresHandler():
                         database=
                         user=
                         password=
+            pool_size (int): Number of connections kept open by the engine
+            max_overflow (int): Number of connections allowed in addition to pool_size
+            pool_pre_ping (bool): Test connections before they are handed out
+            pool_recycle (int): Seconds after which connections are replaced
+            The pool options can also be given in the configuration (e.g. pool_size=10)
         """
 
         self.dbschema = dbschema
+        self.pool_options = {'pool_size':pool_size,
+                             'max_overflow':max_overflow,
+                             'pool_pre_ping':pool_pre_ping,
+                             'pool_recycle':pool_recycle}
 
         if(config is None):
             if(Path(file_location).suffix == ".ini" ):
@@ -43,6 +65,13 @@ class PostgresHandler():
         else:
             self.config = config
 
+        if(self.config is not None):
+            for option in ['pool_size', 'max_overflow', 'pool_recycle']:
+                if(option in self.config):
+                    self.pool_options[option] = int(self.config[option])
+            if('pool_pre_ping' in self.config):
+                self.pool_options['pool_pre_ping'] = str(self.config['pool_pre_ping']).lower() in ['true', '1', 'yes']
+
     def connect(self):
         """
             Connect to the PostgreSQL database
@@ -63,11 +92,7 @@ class PostgresHandler():
             #    print(f"Connection to {self.config['host']} established.")
             #    self.con = con
 
-            connect_str = f"postgresql+psycopg2://{self.config['user']}:{self.config['password']}@{self.config['host']}:{self.config['port']}/{self.config['database']}"
-            self.engine = create_engine(
-                connect_str,
-                connect_args={'options': '-csearch_path={}'.format(self.dbschema)}
-            )
+            self.engine = get_engine(self.config, self.dbschema, **self.pool_options)
 
         #except (psycopg2.DatabaseError, Exception) as error:
         except ( Exception) as error:
@@ -76,14 +101,55 @@ class PostgresHandler():
     def close(self):
         """
             closes connection
+            The engine stays in the registry, so its connections can be reused.
+            Use dispose_engines to close all connections.
         """
 
         try:
-            self.engine.dispose()
-        except Exception as error:
+            del self.engine
+        except AttributeError as error:
             print(error)
             print("Was connection established?")
-            
+
+def get_engine(config, dbschema,
+               pool_size=POSTGRES_POOL_SIZE,
+               max_overflow=POSTGRES_MAX_OVERFLOW,
+               pool_pre_ping=POSTGRES_PRE_PING,
+               pool_recycle=POSTGRES_RECYCLE):
+    """
+        Returns engine for config and schema, it is only created on first call
+        config (Dict): Contains essential authorization credentials
+        dbschema (string): Schema which is used as search_path
+        pool_size, max_overflow, pool_pre_ping, pool_recycle: see sqlalchemy.create_engine,
+                    only used if the engine is created
+    """
+
+    key = (config['host'], str(config['port']), config['database'], config['user'],
+           config['password'], dbschema)
+
+    with ENGINES_LOCK:
+        if(key not in ENGINES):
+            connect_str = f"postgresql+psycopg2://{config['user']}:{config['password']}@{config['host']}:{config['port']}/{config['database']}"
+            ENGINES[key] = create_engine(
+                connect_str,
+                connect_args={'options': '-csearch_path={}'.format(dbschema)},
+                pool_size=pool_size,
+                max_overflow=max_overflow,
+                pool_pre_ping=pool_pre_ping,
+                pool_recycle=pool_recycle
+            )
+
+        return ENGINES[key]
+
+def dispose_engines():
+    """
+        Closes all connections of all engines and empties the registry
+    """
+
+    with ENGINES_LOCK:
+        for engine in ENGINES.values():
+            engine.dispose()
+        ENGINES.clear()
 
 def check_config_completeness(config):
     """
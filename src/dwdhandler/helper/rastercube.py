@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 16:20:00 2026
+
+@author: Tobias Schad
+@email: tobias.schad@googlemail.com
+@description: Monthly raster grids in one NetCDF file (time x y x) """
+
+import os
+import datetime
+import numpy as np
+
+# try to import netCDF4
+try:
+    import netCDF4
+    lnetcdf = True
+except:
+    lnetcdf = False
+
+try:
+    from pyproj import CRS
+    lcrs = True
+except:
+    lcrs = False
+
+from ..constants.constpar import RASTERCUBETIMEUNITS, RASTERCUBECOMPLEVEL
+
+class raster_cube():
+    def __init__(self,filename,par,mode='r'):
+        """ Class to handle NetCDF file with monthly raster grids of one parameter
+            The grids are stored as float32 with dimensions (time, y, x), y from south to north,
+            compressed and chunked by month, so one month can be read without reading the others.
+            filename: NetCDF file
+            par:      name of parameter, used as variable name
+            mode:     'r' read only, 'a' append (file is created if it does not exist)
+        """
+
+        self.filename = filename
+        self.par      = par
+
+        if(mode == 'a' and not os.path.isfile(filename)):
+            self.nc = netCDF4.Dataset(filename,'w',format='NETCDF4')
+            self.lcreated = False
+        else:
+            self.nc = netCDF4.Dataset(filename,mode)
+            self.lcreated = True
+
+        self.set_time_index()
+
+    def set_time_index(self):
+        """ Dictionary (year, month) --> index of time dimension """
+
+        self.time_index = {}
+        if(not self.lcreated):
+            return
+
+        times = netCDF4.num2date(self.nc['time'][:],RASTERCUBETIMEUNITS,only_use_cftime_datetimes=False)
+        for itime, date in enumerate(np.atleast_1d(times)):
+            self.time_index[(date.year, date.month)] = itime
+
+    def create(self,header,crs,gridx,gridy,lons=None,lats=None):
+        """ Creates dimensions and variables
+            header: dictionary with ncols, nrows, xllcorner, yllcorner, cellsize, nodata_value of ASCII grid
+            crs:    coordinate reference system of grid (e.g. epsg:31467)
+            gridx:  x coordinates (length ncols)
+            gridy:  y coordinates (length nrows)
+            lons:   longitudes with shape (ncols, nrows), default None --> not written
+            lats:   latitudes with shape (ncols, nrows), default None --> not written
+        """
+
+        nc = self.nc
+
+        nc.createDimension('time',None)
+        nc.createDimension('y',header['nrows'])
+        nc.createDimension('x',header['ncols'])
+
+        var_time = nc.createVariable('time','f8',('time',))
+        var_time.units    = RASTERCUBETIMEUNITS
+        var_time.calendar = 'standard'
+
+        var_x = nc.createVariable('x','f8',('x',))
+        var_x.standard_name = 'projection_x_coordinate'
+        var_x.units = 'm'
+        var_x[:] = gridx
+
+        var_y = nc.createVariable('y','f8',('y',))
+        var_y.standard_name = 'projection_y_coordinate'
+        var_y.units = 'm'
+        var_y[:] = gridy
+
+        var_crs = nc.createVariable('crs','i4')
+        var_crs.epsg_code = crs.upper()
+        if(lcrs):
+            var_crs.spatial_ref = CRS.from_user_input(crs).to_wkt()
+
+        coordinates = 'x y'
+        if(lons is not None and lats is not None):
+            var_lon = nc.createVariable('lon','f8',('y','x'),zlib=True,complevel=RASTERCUBECOMPLEVEL)
+            var_lon.standard_name = 'longitude'
+            var_lon.units = 'degrees_east'
+            var_lon[:] = np.asarray(lons).T
+
+            var_lat = nc.createVariable('lat','f8',('y','x'),zlib=True,complevel=RASTERCUBECOMPLEVEL)
+            var_lat.standard_name = 'latitude'
+            var_lat.units = 'degrees_north'
+            var_lat[:] = np.asarray(lats).T
+            coordinates = 'lon lat'
+
+        var_data = nc.createVariable(self.par,'f4',('time','y','x'),
+                                     zlib=True,complevel=RASTERCUBECOMPLEVEL,
+                                     chunksizes=(1,header['nrows'],header['ncols']),
+                                     fill_value=np.float32(header['nodata_value']))
+        var_data.grid_mapping = 'crs'
+        var_data.coordinates  = coordinates
+
+        # header of ASCII grid, so the grid properties are known without ASCII file
+        for key in ['ncols','nrows','xllcorner','yllcorner','cellsize','nodata_value']:
+            nc.setncattr(key,header[key])
+
+        self.lcreated = True
+
+    def header(self):
+        """ Returns header of ASCII grid as dictionary """
+
+        return {key:self.nc.getncattr(key) for key in ['ncols','nrows','xllcorner','yllcorner','cellsize','nodata_value']}
+
+    def crs(self):
+        """ Returns coordinate reference system of grid """
+        return self.nc['crs'].epsg_code.lower()
+
+    def write_month(self,year,month,data):
+        """ Writes grid of one month, a month already in file is replaced
+            data: grid with shape (ncols, nrows) like returned by dow_handler.read_raster_ascii
+        """
+
+        if((year, month) in self.time_index):
+            itime = self.time_index[(year, month)]
+        else:
+            itime = len(self.nc.dimensions['time'])
+            self.nc['time'][itime] = netCDF4.date2num(datetime.datetime(year,month,1),RASTERCUBETIMEUNITS)
+            self.time_index[(year, month)] = itime
+
+        self.nc[self.par][itime] = np.asarray(data,dtype=np.float32).T
+
+    def read_month(self,year,month):
+        """ Reads grid of one month with shape (ncols, nrows), missing values are masked
+            returns None if month is not in file
+        """
+
+        if((year, month) not in self.time_index):
+            return None
+
+        return self.nc[self.par][self.time_index[(year, month)]].T
+
+    def close(self):
+        """ Close file """
+        self.nc.close()
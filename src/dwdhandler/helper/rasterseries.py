@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 17:40:00 2026
+
+@author: Tobias Schad
+@email: tobias.schad@googlemail.com
+@description: Time series of raster grids which are read month by month """
+
+import os
+import numpy as np
+
+from ..constants.constpar import RASTERFACTDICT
+from .rastercube import raster_cube
+
+class raster_series():
+    def __init__(self,dow,year,month,netcdf=False,calc_dev=False,clim_mean=False,clim_year_s=None,dtype=np.float32):
+        """ Time series of monthly raster grids of dow_handler, a grid is only read when it is needed.
+            Iterating over the series yields the grids (masked arrays with shape (ncols, nrows),
+            multiplied with the factor of the parameter) or tuples (grid, deviation) with calc_dev.
+            Only one grid is in memory at once, besides the climatology (one grid per month),
+            which is cached in dow_handler and only read once.
+            dow:         dow_handler with dtype raster
+            year:        single year or list with start and end year
+            month:       single month or list with start and end month
+            netcdf:      read grids from NetCDF file (see dow_handler.retrieve_dwd_raster(to_netcdf=True))
+            calc_dev:    also yield deviation from climatology
+            clim_mean:   climatology is climate normal period (multi annual grids)
+            clim_year_s: first year of climate normal period (or year of reference with clim_mean=False)
+            dtype:       type of grids (default np.float32)
+        """
+
+        self.dow         = dow
+        self.netcdf      = netcdf
+        self.calc_dev    = calc_dev
+        self.clim_mean   = clim_mean
+        self.clim_year_s = clim_year_s
+        self.dtype       = dtype
+
+        if(isinstance(year, list)):
+            year_arange = np.arange(year[0],year[-1]+1)
+        else:
+            year_arange = np.array([year])
+
+        if(isinstance(month, list)):
+            month_arange = np.arange(month[0],month[-1]+1)
+        else:
+            month_arange = np.array([month])
+
+        self.dates = [(int(tyear), int(tmonth)) for tyear in year_arange for tmonth in month_arange]
+
+        if(calc_dev and clim_year_s is None):
+            raise ValueError("Please specify clim_year_s")
+
+        self.cube = None
+        if(netcdf):
+            self.cube = raster_cube(dow.create_raster_cube_filename(),dow.par)
+            header = self.cube.header()
+            dow.rncols     = header['ncols']
+            dow.rnrows     = header['nrows']
+            dow.xllcorner  = header['xllcorner']
+            dow.yllcorner  = header['yllcorner']
+            dow.rcellsize  = header['cellsize']
+            dow.missingval = header['nodata_value']
+            dow.crs_in     = self.cube.crs()
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __iter__(self):
+        for tyear, tmonth in self.dates:
+            yield self.get_month(tyear,tmonth)
+
+    def __getitem__(self,index):
+        if(isinstance(index, slice)):
+            series = raster_series.__new__(raster_series)
+            series.__dict__.update(self.__dict__)
+            series.dates = self.dates[index]
+            return series
+
+        return self.get_month(*self.dates[index])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+    def close(self):
+        """ Close NetCDF file """
+
+        if(self.cube is not None):
+            self.cube.close()
+            self.cube = None
+
+    def get_month(self,year,month):
+        """ Returns grid of year and month (and deviation with calc_dev),
+            grid is fully masked if there is no data
+        """
+
+        data = self.read_grid(year,month)
+
+        if(self.calc_dev):
+            return data, data - self.get_clim(month)
+        else:
+            return data
+
+    def read_grid(self,year,month,clim=False):
+        """ Reads one grid from NetCDF or ASCII file, masks the missing values and multiplies the factor """
+
+        dow  = self.dow
+        data = None
+
+        if(clim):
+            filename = dow.create_raster_filename(self.clim_year_s,month,readf=True,clim_mean=self.clim_mean)
+            data = dow.read_raster_ascii(dow.pathdlocal+filename)
+        elif(self.netcdf):
+            data = self.cube.read_month(year,month)
+            if(data is not None):
+                data = np.ma.filled(data,dow.missingval)
+        else:
+            filename = dow.pathdlocal+dow.create_raster_filename(year,month,readf=True)
+            if(os.path.isfile(filename)):
+                data = dow.read_raster_ascii(filename)
+
+        if(data is None):
+            if(not hasattr(dow,'rncols')):
+                self.set_grid_props()
+            return np.ma.masked_all((dow.rncols,dow.rnrows),dtype=self.dtype)
+
+        data = np.ma.masked_equal(data.astype(self.dtype,copy=False),dow.missingval,copy=False)
+
+        if(dow.par in RASTERFACTDICT.keys()):
+            data *= RASTERFACTDICT[dow.par]
+
+        return data
+
+    def set_grid_props(self):
+        """ Reads grid properties from the first ASCII file of the series which exists """
+
+        dow = self.dow
+        for tyear, tmonth in self.dates:
+            filename = dow.pathdlocal+dow.create_raster_filename(tyear,tmonth,readf=True)
+            if(os.path.isfile(filename)):
+                dow.read_raster_ascii(filename)
+                return
+
+        raise FileNotFoundError(f"No raster data of {dow.par} found in {dow.pathdlocal}")
+
+    def get_clim(self,month):
+        """ Returns climatology of month, it is read once and cached in dow_handler """
+
+        key = (self.dow.par, self.clim_year_s, self.clim_mean, month, np.dtype(self.dtype).str)
+        if(key not in self.dow.raster_clim):
+            self.dow.raster_clim[key] = self.read_grid(self.clim_year_s,month,clim=True)
+
+        return self.dow.raster_clim[key]
+
+    def to_array(self):
+        """ Reads all grids into one masked array with shape (months, ncols, nrows)
+            returns array (and array of deviations with calc_dev)
+        """
+
+        data_r = None
+        data_r_anom = None
+
+        for ii, grids in enumerate(self):
+            if(not self.calc_dev):
+                grids = (grids,)
+
+            if(data_r is None):
+                data_r = np.ma.masked_all((len(self),)+grids[0].shape,dtype=self.dtype)
+                if(self.calc_dev):
+                    data_r_anom = np.ma.masked_all((len(self),)+grids[0].shape,dtype=self.dtype)
+
+            data_r[ii] = grids[0]
+            if(self.calc_dev):
+                data_r_anom[ii] = grids[1]
+
+        if(self.calc_dev):
+            return data_r, data_r_anom
+        else:
+            return data_r
+
+    def mean(self,deviation=False):
+        """ Mean over time of each grid cell, only one grid is read at once
+            deviation: mean of deviations instead of grids (needs calc_dev)
+            returns masked array with shape (ncols, nrows), masked where no month has data
+        """
+
+        data_sum = None
+        for grids in self:
+            if(self.calc_dev):
+                grid = grids[1] if deviation else grids[0]
+            else:
+                grid = grids
+
+            if(data_sum is None):
+                data_sum = np.zeros(grid.shape)
+                data_cnt = np.zeros(grid.shape,dtype=np.int64)
+
+            data_sum += grid.filled(0)
+            data_cnt += ~np.ma.getmaskarray(grid)
+
+        return np.ma.masked_where(data_cnt == 0, data_sum/np.maximum(data_cnt,1))
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 20:30:00 2026
+
+@author: Tobias Schad
+@email: tobias.schad@googlemail.com
+@description: Transports (FTP, HTTPS) to reach the server. Each transport is a pool of
+              connections with the interface of cftp """
+
+from ..constants.serverdata import FTP_TRANSPORT, HTTPS_TRANSPORT
+from .ftp import FTP_POOL
+from .https import HTTPS_POOL, lrequests
+
+TRANSPORT_POOLS = {FTP_TRANSPORT:FTP_POOL,
+                   HTTPS_TRANSPORT:HTTPS_POOL}
+
+def get_transport_pool(transport):
+    """ Returns connection pool of transport """
+    return TRANSPORT_POOLS[transport]
+
+def register_transport(transport,pool):
+    """ Adds transport, pool must have acquire, release and max_size like ftp_pool """
+    TRANSPORT_POOLS[transport] = pool
+
+def check_transport(transport):
+    """ Returns True if transport can be used """
+
+    if(transport not in TRANSPORT_POOLS):
+        print(f"Transport {transport} is not known, use one of {list(TRANSPORT_POOLS)}")
+        return False
+
+    if(transport == HTTPS_TRANSPORT and not lrequests):
+        print("requests is not installed!\nHTTPS transport will not work")
+        return False
+
+    return True
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 00:45:00 2026
+
+@author: Tobias Schad
+@email: tobias.schad@googlemail.com
+@description: daily and monthly climatology and climate statistics against hand-computed values """
+
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+
+from dwdhandler.calculation.calc_stats import station_data_handler
+
+NAN = np.nan
+
+# 2000 is a leap year, Feb 29 must not be part of the daily climatology and must not shift later days
+DATA = [('2000-01-01',  1.0,  NAN),
+        ('2001-01-01',  3.0,  2.0),
+        ('2002-01-01',  NAN,  4.0),
+        ('2000-02-28',  5.0,  1.0),
+        ('2000-02-29',100.0,100.0),
+        ('2001-03-01',  7.0,  0.0),
+        ('2000-12-31', -2.0,  3.0),
+        ('2001-12-31',  4.0,  5.0)]
+
+class test_calc_stats(unittest.TestCase):
+
+    def setUp(self):
+        df = pd.DataFrame([row[1:] for row in DATA], columns=['TMK','RSK'],
+                          index=pd.DatetimeIndex([row[0] for row in DATA],name='MESS_DATUM'))
+        self.stat = station_data_handler(df,44,tabname='kl_daily',resolution='daily',par='kl',
+                                         base_dir=tempfile.gettempdir()+'/')
+        self.df = self.stat.df_tot
+
+    def get_stat(self,df_stats,group_name,group,stat):
+        """ Returns row of group and stat of long format as tuple (TMK, RSK) """
+
+        row = df_stats[(df_stats[group_name] == group) & (df_stats['stat'] == stat)]
+        self.assertEqual(len(row),1)
+        return tuple(row[['TMK','RSK']].iloc[0])
+
+    def test_daily_clim(self):
+        df_clim = self.stat.calc_daily_clim(self.df)
+
+        self.assertEqual(len(df_clim),365)
+        self.assertEqual(df_clim.index.name,'DOY')
+        self.assertEqual(list(df_clim.index[[0,-1]]),[1,365])
+
+        self.assertEqual(tuple(df_clim.loc[1]),(2.0,3.0))    # NaN is skipped
+        self.assertEqual(tuple(df_clim.loc[59]),(5.0,1.0))   # Feb 28
+        self.assertEqual(tuple(df_clim.loc[60]),(7.0,0.0))   # Mar 1, also in leap year
+        self.assertEqual(tuple(df_clim.loc[365]),(1.0,4.0))  # Dec 31, also in leap year
+        self.assertEqual(int(df_clim['TMK'].notna().sum()),4)
+        self.assertTrue(df_clim.loc[2].isna().all())
+
+    def test_daily_clim_stats(self):
+        df_stats = self.stat.calc_daily_clim_stats(self.df,percentiles=[0.1,0.9])
+
+        self.assertEqual(len(df_stats),365*4)
+        self.assertEqual(list(df_stats['stat'].iloc[:4]),['max','min',0.1,0.9])
+
+        self.assertEqual(self.get_stat(df_stats,'DOY',1,'max'),(3.0,4.0))
+        self.assertEqual(self.get_stat(df_stats,'DOY',1,'min'),(1.0,2.0))
+        np.testing.assert_allclose(self.get_stat(df_stats,'DOY',1,0.1),(1.2,2.2))
+        np.testing.assert_allclose(self.get_stat(df_stats,'DOY',1,0.9),(2.8,3.8))
+
+        self.assertEqual(self.get_stat(df_stats,'DOY',60,'max'),(7.0,0.0))
+        self.assertEqual(self.get_stat(df_stats,'DOY',60,0.9),(7.0,0.0))
+        np.testing.assert_allclose(self.get_stat(df_stats,'DOY',365,0.1),(-1.4,3.2))
+        np.testing.assert_allclose(self.get_stat(df_stats,'DOY',365,0.9),(3.4,4.8))
+
+        # Feb 29 is skipped, days without data are NaN
+        self.assertEqual(df_stats['TMK'].max(),7.0)
+        self.assertTrue(np.isnan(self.get_stat(df_stats,'DOY',2,'max')).all())
+
+    def test_monthly_clim_stats(self):
+        df_stats = self.stat.calc_monthly_clim_stats(self.df,percentiles=[0.1,0.9])
+
+        self.assertEqual(sorted(df_stats['Monat'].unique()),[1,2,3,12])
+        self.assertEqual(len(df_stats),4*4)
+
+        # Feb 29 belongs to February
+        self.assertEqual(self.get_stat(df_stats,'Monat',2,'max'),(100.0,100.0))
+        self.assertEqual(self.get_stat(df_stats,'Monat',2,'min'),(5.0,1.0))
+        np.testing.assert_allclose(self.get_stat(df_stats,'Monat',2,0.1),(14.5,10.9))
+        np.testing.assert_allclose(self.get_stat(df_stats,'Monat',1,0.9),(2.8,3.8))
+        np.testing.assert_allclose(self.get_stat(df_stats,'Monat',12,0.1),(-1.4,3.2))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 22:10:00 2026
+
+@author: Tobias Schad
+@email: tobias.schad@googlemail.com
+@description: HTTPS transport against a local stand-in of opendata.dwd.de (python http.server) """
+
+import os
+import io
+import gzip
+import shutil
+import zipfile
+import tempfile
+import threading
+import functools
+import contextlib
+import unittest
+import pandas as pd
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+from dwdhandler.helper.https import chttps, http_error_perm, lrequests
+from dwdhandler.constants.serverdata import SERVERNAME, SERVERPATH_CLIMATE_GERM, HTTPSBASEURL
+
+PATHREMOTE = SERVERPATH_CLIMATE_GERM+'daily/kl/recent/'
+STATIONS   = ['00001','00044','00073']
+BROKEN     = '00090' # archive which is no zip file
+
+STATIONLIST = ("Stations_id von_datum bis_datum Stationshoehe geoBreite geoLaenge Stationsname Bundesland Abgabe\n"
+               "----------- --------- --------- ------------- --------- --------- ----------------------------------------- ---------- ------\n"
+               "00001 19370101 20240110            478     47.8413    8.8493 Aach                                     Baden-Württemberg                        Frei\n"
+               "00044 19690101 20240110             44     52.9336    8.2370 Großenkneten                             Niedersachsen                            Frei\n"
+               "00073 19520701 20240110            374     48.6183   13.0620 Aldersbach-Kramersepp                    Bayern                                   Frei\n"
+               "00078 19610101 20240110             64     52.4853    7.9126 Alfhausen                                Niedersachsen                            Frei\n")
+
+class quiet_handler(SimpleHTTPRequestHandler):
+    """ Answers single range requests like opendata.dwd.de, If-Range is compared with Last-Modified """
+
+    range_requests = [] # (Range, If-Range) of requests
+    ignore_range   = False
+
+    def log_message(self,*args):
+        pass
+
+    def end_headers(self):
+        self.send_header('Accept-Ranges','bytes')
+        super().end_headers()
+
+    def do_GET(self):
+        path = self.translate_path(self.path)
+        rng  = self.headers.get('Range')
+        if(rng is None or not os.path.isfile(path)):
+            return super().do_GET()
+
+        self.range_requests.append((rng, self.headers.get('If-Range')))
+        modified = self.date_time_string(int(os.path.getmtime(path)))
+        if(self.ignore_range or self.headers.get('If-Range',modified) != modified):
+            return super().do_GET()
+
+        with open(path,'rb') as fil:
+            data = fil.read()
+        start = int(rng.split('=')[1].split('-')[0])
+        self.send_response(206)
+        self.send_header('Content-Range',f'bytes {start}-{len(data)-1}/{len(data)}')
+        self.send_header('Content-Length',str(len(data)-start))
+        self.send_header('Last-Modified',modified)
+        self.end_headers()
+        self.wfile.write(data[start:])
+
+def write_station_archive(dir_out,key,ndays=5):
+    """ Writes zip archive of daily kl data of station key like DWD """
+
+    csv = "STATIONS_ID;MESS_DATUM;QN_3;  FX;  FM;QN_4; RSK;RSKF; SDK;SHK_TAG;  NM; VPM;  PM; TMK; UPM; TXK; TNK; TGK;eor\n"
+    for day in range(ndays):
+        csv += f"{int(key)};202401{day+1:02d};10;5.0;3.0;3;0.1;6;1.0;0;7.0;8.0;1000.0;{day}.5;80;5.0;-1.0;-2.0;eor\n"
+
+    with zipfile.ZipFile(os.path.join(dir_out,f'tageswerte_KL_{key}_akt.zip'),'w') as fil_zip:
+        fil_zip.writestr(f'produkt_klima_tag_20230101_20240110_{key}.txt',csv)
+        fil_zip.writestr(f'Metadaten_Geographie_{key}.txt','Stations_id;Stationshoehe\n')
+
+@unittest.skipUnless(lrequests, "requests is not installed")
+class test_https(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.www_dir = os.path.join(cls.tmp_dir,'www')
+        dir_remote  = os.path.join(cls.www_dir,PATHREMOTE)
+        os.makedirs(dir_remote)
+
+        with open(os.path.join(dir_remote,'KL_Tageswerte_Beschreibung_Stationen.txt'),'wb') as fil:
+            fil.write(STATIONLIST.encode('cp1252'))
+        for key in STATIONS:
+            write_station_archive(dir_remote,key)
+        with open(os.path.join(dir_remote,f'tageswerte_KL_{BROKEN}_akt.zip'),'wb') as fil:
+            fil.write(b'no zip')
+        with open(os.path.join(dir_remote,'data.txt.gz'),'wb') as fil:
+            fil.write(gzip.compress(b'1 2 3\n'*1000))
+
+        cls.server = ThreadingHTTPServer(('127.0.0.1',0),functools.partial(quiet_handler,directory=cls.www_dir))
+        threading.Thread(target=cls.server.serve_forever,daemon=True).start()
+
+        cls.base_url_old = HTTPSBASEURL.get(SERVERNAME)
+        HTTPSBASEURL[SERVERNAME] = f'http://127.0.0.1:{cls.server.server_address[1]}/'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        HTTPSBASEURL[SERVERNAME] = cls.base_url_old
+        shutil.rmtree(cls.tmp_dir)
+
+    def setUp(self):
+        self.con = chttps(SERVERNAME,retries=0)
+        self.con.open_ftp()
+        self.con.cwd_ftp(PATHREMOTE)
+
+    def tearDown(self):
+        self.con.close_ftp()
+
+    def test_listing_without_columns(self):
+        files = self.con.retr_files_facts_ftp()
+        local = os.path.join(self.www_dir,PATHREMOTE,'tageswerte_KL_00044_akt.zip')
+
+        self.assertEqual(len(files),len(STATIONS)+3)
+        self.assertEqual(files['tageswerte_KL_00044_akt.zip'][0],os.path.getsize(local))
+        self.assertEqual(len(files['tageswerte_KL_00044_akt.zip'][1]),14)
+        self.assertEqual(sorted(self.con.retr_files_facts_ftp(ending='.zip')),
+                         sorted([f'tageswerte_KL_{key}_akt.zip' for key in STATIONS+[BROKEN]]))
+
+    def test_no_listing(self):
+        self.con.cwd_ftp(PATHREMOTE+'KL_Tageswerte_Beschreibung_Stationen.txt')
+        with self.assertRaises(http_error_perm):
+            self.con.retr_files_facts_ftp()
+
+    def test_save_file(self):
+        local = os.path.join(self.tmp_dir,'data.txt')
+        self.con.save_file('data.txt.gz',local,decompress='gzip')
+        with open(local,'rb') as fil:
+            self.assertEqual(fil.read(),b'1 2 3\n'*1000)
+        self.assertFalse(os.path.isfile(local+'.part'))
+
+        # not modified --> file is kept
+        with open(local,'wb') as fil:
+            fil.write(b'local')
+        os.utime(local,(os.path.getmtime(local)+10,)*2)
+        self.con.save_file('data.txt.gz',local,decompress='gzip',if_modified=True)
+        with open(local,'rb') as fil:
+            self.assertEqual(fil.read(),b'local')
+
+        # default always downloads, like cftp
+        self.con.save_file('data.txt.gz',local,decompress='gzip')
+        with open(local,'rb') as fil:
+            self.assertEqual(fil.read(),b'1 2 3\n'*1000)
+
+        with self.assertRaises(http_error_perm):
+            self.con.save_file('missing.zip',os.path.join(self.tmp_dir,'missing.zip'))
+        self.assertFalse(os.path.isfile(os.path.join(self.tmp_dir,'missing.zip.part')))
+
+    def test_save_file_resume(self):
+        remote = os.path.join(self.www_dir,PATHREMOTE,'data.txt.gz')
+        local  = os.path.join(self.tmp_dir,'resume.gz')
+        with open(remote,'rb') as fil:
+            data = fil.read()
+        modified = quiet_handler.date_time_string(None,int(os.path.getmtime(remote)))
+
+        def write_part(part,version):
+            with open(local+'.part','wb') as fil:
+                fil.write(part)
+            with open(local+'.part.meta','w') as fil:
+                fil.write(version)
+
+        def check_local():
+            with open(local,'rb') as fil:
+                self.assertEqual(fil.read(),data)
+            self.assertFalse(os.path.isfile(local+'.part'))
+            self.assertFalse(os.path.isfile(local+'.part.meta'))
+
+        # same version --> continued with If-Range
+        quiet_handler.range_requests.clear()
+        write_part(data[:20],modified)
+        self.con.save_file('data.txt.gz',local)
+        check_local()
+        self.assertEqual(quiet_handler.range_requests,[('bytes=20-',modified)])
+
+        # other version --> started again without range request
+        quiet_handler.range_requests.clear()
+        write_part(b'x'*20,'Thu, 01 Jan 2015 00:00:00 GMT')
+        self.con.save_file('data.txt.gz',local)
+        check_local()
+        self.assertEqual(quiet_handler.range_requests,[])
+
+        # server sends whole file (200), e.g. changed after HEAD --> restarted from zero
+        write_part(b'x'*20,modified)
+        quiet_handler.ignore_range = True
+        try:
+            self.con.save_file('data.txt.gz',local)
+        finally:
+            quiet_handler.ignore_range = False
+        check_local()
+
+    def test_retrieve_dwd_station(self):
+        from dwdhandler import dow_handler
+
+        base_dir = os.path.join(self.tmp_dir,'dwd_data')+'/'
+        with contextlib.redirect_stdout(io.StringIO()):
+            dow = dow_handler(dtype='station',par='kl',resolution='daily',period='recent',
+                              base_dir=base_dir,transport='https')
+            self.assertEqual(dow.df_station_list.loc['00044','name'],'Großenkneten')
+
+            dow.retrieve_dwd_station(STATIONS+['00078'])
+
+        self.assertEqual(dow.keys_not_found,['00078'])
+        self.assertEqual(dow.stations_not_found,[PATHREMOTE+'00078'])
+
+        df = dow.get_dwd_stations_data([int(key) for key in STATIONS])
+        self.assertEqual(df.shape[0],5*len(STATIONS))
+
+    def test_retrieve_dwd_station_pool(self):
+        from dwdhandler import dow_handler
+
+        keys    = STATIONS+['00078',BROKEN]
+        results = []
+        for workers in [None, 3]:
+            base_dir = os.path.join(self.tmp_dir,f'dwd_data_{workers}')+'/'
+            with contextlib.redirect_stdout(io.StringIO()):
+                dow = dow_handler(dtype='station',par='kl',resolution='daily',period='recent',
+                                  base_dir=base_dir,transport='https')
+                dow.retrieve_dwd_station(keys,workers=workers)
+            results.append((dow.keys_not_found, dow.stations_not_found,
+                            dow.get_dwd_stations_data([int(key) for key in keys])))
+
+        (keys_serial, stations_serial, df_serial), (keys_pool, stations_pool, df_pool) = results
+
+        self.assertEqual(keys_serial,['00078'])
+        self.assertEqual(stations_serial,[PATHREMOTE+'00078',PATHREMOTE+f'tageswerte_KL_{BROKEN}_akt.zip'])
+        self.assertEqual(keys_pool,keys_serial)
+        self.assertEqual(stations_pool,stations_serial)
+        self.assertEqual(df_serial.shape[0],5*len(STATIONS))
+        pd.testing.assert_frame_equal(df_pool,df_serial)
+
+if __name__ == '__main__':
+    unittest.main()
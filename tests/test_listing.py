@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 00:20:00 2026
+
+@author: Tobias Schad
+@email: tobias.schad@googlemail.com
+@description: cache of remote directory listings """
+
+import shutil
+import tempfile
+import unittest
+
+from dwdhandler.helper.listing import listing_cache
+
+PATHREMOTE = 'climate_environment/CDC/observations_germany/climate/daily/kl/recent/'
+
+class test_listing(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_listing_per_transport(self):
+        ftp_files   = {'a.zip':(10,'20240101123456')}
+        https_files = {'a.zip':(10,'20240101123400')}
+
+        cache = listing_cache(self.cache_dir)
+        self.assertEqual(cache.get(PATHREMOTE,lambda: ftp_files,transport='ftp'),ftp_files)
+        self.assertEqual(cache.get(PATHREMOTE,lambda: https_files,transport='https'),https_files)
+
+        # later session reads both listings from the JSON files
+        cache = listing_cache(self.cache_dir)
+        retrieve = lambda: self.fail('listing is cached')
+        self.assertEqual(cache.get(PATHREMOTE,retrieve,transport='ftp'),ftp_files)
+        self.assertEqual(cache.get(PATHREMOTE,retrieve,transport='https'),https_files)
+
+        cache.invalidate(PATHREMOTE,transport='https')
+        self.assertEqual(cache.get(PATHREMOTE,retrieve,transport='ftp'),ftp_files)
+        self.assertEqual(cache.get(PATHREMOTE,lambda: {},transport='https'),{})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 23:40:00 2026
+
+@author: Tobias Schad
+@email: tobias.schad@googlemail.com
+@description: date range of station queries, end is inclusive for all resolutions """
+
+import unittest
+
+from dwdhandler.dow_handler import dow_handler
+
+def make_handler(resolution):
+    """ dow_handler without station list, enough to build filters """
+
+    dow = dow_handler.__new__(dow_handler)
+    dow.resolution = resolution
+    dow.par = 'kl'
+    return dow
+
+class test_station_filter(unittest.TestCase):
+
+    def test_end_date_includes_whole_day(self):
+        for resolution, end_excl in [('10_minutes','202401060000'),('hourly','2024010600'),('daily','20240106'),
+                                     ('monthly','202402'),('yearly','2025')]:
+            dow = make_handler(resolution)
+            self.assertEqual(dow.station_date_end('2024-01-05'),end_excl)
+            self.assertTrue(dow.create_station_filter('2024-01-01','2024-01-05').endswith(f' < {end_excl}'))
+            self.assertIn(('MESS_DATUM','<',int(end_excl)),dow.create_station_filter_list([44],end='2024-01-05'))
+
+    def test_end_time_includes_time_step(self):
+        self.assertEqual(make_handler('hourly').station_date_end('2024-01-05 23:00'),'2024010600')
+        self.assertEqual(make_handler('10_minutes').station_date_end('2024-01-05 12:05'),'202401051210')
+        self.assertEqual(make_handler('daily').station_date_end('2024-01-05 12:00'),'20240106')
+
+if __name__ == '__main__':
+    unittest.main()